@@ -0,0 +1,303 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import tempfile
+import threading
+import time
+import urllib.request
+import yaml
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process, Queue
+from urllib.parse import parse_qs, urlparse
+
+# Benchmarks rancher-audit.py end to end against local mock Rancher servers, so performance
+# regressions show up without access to production management planes.
+
+AUDIT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rancher-audit.py")
+
+# ==========================================
+# MOCK RANCHER FLEET
+# ==========================================
+
+K8S_VERSIONS = ["v1.28.15+rke2r1", "v1.29.10+k3s1", "v1.30.6+rke2r1", "v1.31.2-eks-1", "v1.32.1"]
+HARVESTER_VERSIONS = ["v1.3.2", "v1.4.1", "v1.5.0"]
+
+# Minimal endoflife.date payloads so lifecycle evaluation runs without internet access
+EOL_DATA = {
+    "kubernetes": [
+        {"cycle": "1.33", "eol": "2026-06-28"},
+        {"cycle": "1.32", "eol": "2026-02-28"},
+        {"cycle": "1.31", "eol": "2025-10-28"},
+        {"cycle": "1.30", "eol": "2025-06-28"},
+        {"cycle": "1.29", "eol": "2025-02-28"},
+        {"cycle": "1.28", "eol": "2024-10-28"},
+    ],
+    "rancher": [
+        {"cycle": "2.11", "eol": "2026-10-24", "support": "2026-04-24"},
+        {"cycle": "2.10", "eol": "2026-05-22", "support": "2025-11-22"},
+        {"cycle": "2.9", "eol": "2026-01-01", "support": "2025-07-01"},
+        {"cycle": "2.8", "eol": "2025-06-30", "support": "2024-12-31"},
+    ],
+}
+
+def build_fleet(instance_idx, clusters, harvester_share, seed):
+    """Deterministic cluster and node objects shaped like /v3/clusters and /v3/nodes items."""
+    rng = random.Random(seed * 1000 + instance_idx)
+    fleet = [{"id": "local", "name": "local", "driver": "rke2", "provider": "rke2",
+              "version": {"gitVersion": "v1.30.6+rke2r1"},
+              "allocatable": {"cpu": "8", "memory": "32Gi", "pods": "110"}, "state": "active"}]
+    for i in range(1, clusters):
+        if rng.random() < harvester_share:
+            fleet.append({"id": f"c-hv{i}", "name": f"hv-{instance_idx}-{i}", "driver": "harvester",
+                          "provider": "harvester", "version": {"gitVersion": "v1.29.9+rke2r1"},
+                          "allocatable": {"cpu": "64", "memory": "256Gi", "pods": "200"}, "state": "active"})
+            continue
+        eks = rng.random() < 0.2
+        fleet.append({
+            "id": f"c-{i}", "name": f"cl-{instance_idx}-{i}",
+            "driver": "eks" if eks else rng.choice(["imported", "rke2", "k3s"]),
+            "provider": "eks" if eks else "rke2",
+            "version": {"gitVersion": "v1.31.2-eks-1" if eks else rng.choice(K8S_VERSIONS)},
+            "allocatable": {"cpu": f"{rng.randint(2, 64) * 500}m", "memory": f"{rng.randint(4, 256) * 1048576}Ki", "pods": "110"},
+            "eksConfig": {"region": rng.choice(["us-east-1", "us-west-2"])} if eks else None,
+            # Realistic bulk: Rancher cluster objects carry long condition and annotation lists
+            "conditions": [{"type": t, "status": "True", "message": "ok" * 40} for t in ["Ready", "Provisioned", "Updated"]],
+            "annotations": {f"field.cattle.io/a{k}": "x" * 40 for k in range(8)},
+            "state": "active",
+        })
+    nodes = [{"id": f"{c['id']}:m-1", "clusterId": c["id"],
+              "labels": {"topology.kubernetes.io/region": "us-east-1", "kubernetes.io/arch": rng.choice(["amd64", "arm64"])}}
+             for c in fleet]
+    return fleet, nodes
+
+def make_handler(fleet, nodes, latency, error_rate, stats, lock, rng):
+    by_id = {c["id"]: c for c in fleet}
+    nodes_by_cluster = {n["clusterId"]: n for n in nodes}
+
+    class MockRancherHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def page(self, items, query, path):
+            limit = int(query.get("limit", ["1000"])[0])
+            start = int(query.get("marker", ["0"])[0] or 0)
+            pagination = {"limit": limit}
+            if start + limit < len(items):
+                pagination["next"] = f"http://{self.headers.get('Host')}{path}?limit={limit}&marker={start + limit}"
+            return {"data": items[start:start + limit], "pagination": pagination}
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query, path = parse_qs(url.query), url.path
+            if path == "/_stats":
+                with lock:
+                    return self.send(200, dict(stats))
+
+            endpoint = self.route(path)
+            with lock:
+                stats[endpoint] = stats.get(endpoint, 0) + 1
+            if latency:
+                time.sleep(latency)
+            if error_rate and rng.random() < error_rate:
+                return self.send(503, {"message": "injected error"})
+
+            if endpoint == "server-version":
+                return self.send(200, {"value": "v2.9.3"})
+            if endpoint == "local-cluster":
+                return self.send(200, by_id["local"])
+            if endpoint == "clusters":
+                items = fleet
+                if "name" in query:
+                    items = [c for c in fleet if c["name"] == query["name"][0]]
+                return self.send(200, self.page(items, query, path))
+            if endpoint == "nodes":
+                return self.send(200, self.page(nodes, query, path))
+            if endpoint == "cluster-nodes":
+                node = nodes_by_cluster.get(path.split("/")[3])
+                return self.send(200, {"data": [node] if node else []})
+            if endpoint == "harvester-version":
+                cluster_id = path.split("/")[3]
+                return self.send(200, {"value": HARVESTER_VERSIONS[sum(map(ord, cluster_id)) % len(HARVESTER_VERSIONS)]})
+            if endpoint == "backups-crd":
+                return self.send(200, {"id": "backups.resources.cattle.io"})
+            if endpoint == "lifecycle":
+                product = path.rsplit("/", 1)[-1].replace(".json", "")
+                return self.send(200, EOL_DATA.get(product, []))
+            return self.send(404, {"message": "not found"})
+
+        @staticmethod
+        def route(path):
+            # Endpoint templates, so request counts group like the audit's call sites
+            if path == "/v3/settings/server-version":
+                return "server-version"
+            if path == "/v3/clusters/local":
+                return "local-cluster"
+            if path == "/v3/clusters":
+                return "clusters"
+            if path == "/v3/nodes":
+                return "nodes"
+            if path.startswith("/v3/clusters/") and path.endswith("/nodes"):
+                return "cluster-nodes"
+            if "harvesterhci.io" in path:
+                return "harvester-version"
+            if "backups.resources.cattle.io" in path:
+                return "backups-crd"
+            if path.startswith("/eol/"):
+                return "lifecycle"
+            return "other"
+
+    return MockRancherHandler
+
+def serve_fleet(args, ready):
+    """Runs one mock server per instance (plus the lifecycle API on the first) in a child process."""
+    stats, lock = {}, threading.Lock()
+    ports = []
+    for idx in range(args.instances):
+        fleet, nodes = build_fleet(idx, args.clusters, args.harvester_share, args.seed)
+        handler = make_handler(fleet, nodes, args.latency_ms / 1000.0, args.error_rate, stats, lock,
+                               random.Random(args.seed + idx))
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        ports.append(server.server_address[1])
+    ready.put(ports)
+    threading.Event().wait()
+
+# ==========================================
+# BENCHMARK RUN
+# ==========================================
+
+def load_audit_module():
+    spec = importlib.util.spec_from_file_location("rancher_audit", AUDIT_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def fetch_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stats", timeout=10) as resp:
+        return json.load(resp)
+
+def parse_setting(value):
+    key, _, raw = value.partition("=")
+    return key, yaml.safe_load(raw)
+
+def run_benchmark(args):
+    ready = Queue()
+    server = Process(target=serve_fleet, args=(args, ready), daemon=True)
+    server.start()
+    ports = ready.get(timeout=30)
+    workdir = tempfile.mkdtemp(prefix="rancher-audit-bench-")
+
+    try:
+        audit = load_audit_module()
+        audit.LIFECYCLE_API = f"http://127.0.0.1:{ports[0]}/eol/{{product}}.json"
+        settings = dict(audit.DEFAULT_SETTINGS)
+        settings.update({
+            "lifecycle_cache_dir": os.path.join(workdir, "cache"),
+            "incremental_audit": False,
+            "history_db": "",
+            "retry_backoff_seconds": 0.05,
+        })
+        settings.update(dict(args.set))
+        audit.configure_lifecycle_cache(settings["lifecycle_cache_dir"], settings["lifecycle_cache_ttl_hours"], False)
+
+        instances = [{"name": f"bench-{idx}", "url": f"http://127.0.0.1:{port}", "token": "token-bench:secret",
+                      "comment": "benchmark"} for idx, port in enumerate(ports)]
+
+        print(f"🏁 Benchmarking {args.instances} instance(s) x {args.clusters} clusters "
+              f"({args.harvester_share:.0%} Harvester, {args.latency_ms:g}ms latency, {args.error_rate:.0%} errors)")
+        timings = {}
+        output = io.StringIO() if not args.verbose else None
+        with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+            started = time.monotonic()
+            inventory = audit.run_audit(instances, settings)
+            timings["scan"] = time.monotonic() - started
+
+            started = time.monotonic()
+            audit.save_styled_excel(inventory, os.path.join(workdir, "rancher_inventory.xlsx"),
+                                    constant_memory=settings["excel_constant_memory"])
+            timings["excel"] = time.monotonic() - started
+
+            started = time.monotonic()
+            audit.generate_mermaid_diagram(inventory, os.path.join(workdir, "rancher_architecture.md"),
+                                           layout=settings["mermaid_layout"],
+                                           node_threshold=settings["mermaid_node_threshold"],
+                                           collapse_clusters=settings["mermaid_collapse_clusters"])
+            timings["mermaid"] = time.monotonic() - started
+        audit.close_clients()
+
+        # Every mock server in the child process shares one counter table
+        requests_by_endpoint = fetch_stats(ports[0])
+
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_rss_mib = peak_rss / (1024 * 1024) if os.uname().sysname == "Darwin" else peak_rss / 1024
+
+        return {
+            "fleet": {"instances": args.instances, "clusters_per_instance": args.clusters,
+                      "harvester_share": args.harvester_share, "latency_ms": args.latency_ms,
+                      "error_rate": args.error_rate},
+            "records": {"servers": len(inventory.servers), "downstream": len(inventory.downstream),
+                        "harvester": len(inventory.harvester)},
+            "seconds": {k: round(v, 3) for k, v in timings.items()},
+            "total_seconds": round(sum(timings.values()), 3),
+            "requests": dict(sorted(requests_by_endpoint.items())),
+            "total_requests": sum(requests_by_endpoint.values()),
+            "peak_rss_mib": round(peak_rss_mib, 1),
+        }
+    finally:
+        server.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def print_report(result):
+    print(f"\n📊 Records: {result['records']['servers']} servers, {result['records']['downstream']} downstream, "
+          f"{result['records']['harvester']} Harvester")
+    print("⏱️  Wall clock:")
+    for phase, seconds in result["seconds"].items():
+        print(f"    {phase:<10} {seconds:>8.3f}s")
+    print(f"    {'total':<10} {result['total_seconds']:>8.3f}s")
+    print("🌐 Requests:")
+    for endpoint, count in result["requests"].items():
+        print(f"    {endpoint:<18} {count:>7}")
+    print(f"    {'total':<18} {result['total_requests']:>7}")
+    print(f"🧠 Peak RSS: {result['peak_rss_mib']} MiB")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark rancher-audit.py against a local mock Rancher fleet.")
+    parser.add_argument("--instances", type=int, default=2, help="Mock Rancher management servers")
+    parser.add_argument("--clusters", type=int, default=500, help="Clusters per instance (including local)")
+    parser.add_argument("--harvester-share", type=float, default=0.1, help="Fraction of clusters that are Harvester")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latency injected into every mock response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of responses answered with 503")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the generated fleet")
+    parser.add_argument("--set", action="append", default=[], type=parse_setting, metavar="KEY=VALUE",
+                        help="Override an audit setting, e.g. --set page_size=200 (repeatable)")
+    parser.add_argument("--json", metavar="FILE", help="Also write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the audit's own output")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = run_benchmark(args)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"✅ Results saved: {args.json}")
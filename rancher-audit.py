@@ -1,17 +1,56 @@
 import requests
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
 import urllib3
 import yaml
 import os
 import re
+import json
+import codecs
+import gzip
+import hashlib
+import csv
+import sqlite3
+import random
+import time
+import argparse
+import fnmatch
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+# pandas and xlsxwriter are imported inside the functions that need them, so commands that
+# never classify clusters or render a workbook (summary, lifecycle-check, --help) start fast.
+
 # Disabling SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Global caches for the lifecycle APIs
 _K8S_LIFECYCLES = None
 _RANCHER_LIFECYCLES = None
+_LIFECYCLE_LOCK = threading.Lock()
+
+# On-disk cache for the endoflife.date responses (see configure_lifecycle_cache)
+LIFECYCLE_API = "https://endoflife.date/api/{product}.json"
+LIFECYCLE_PRODUCTS = ["kubernetes", "rancher"]
+_LIFECYCLE_CACHE = {
+    "dir": ".rancher-audit-cache",
+    "ttl_hours": 24,
+    "offline": False,
+}
+
+# Per-instance HTTP clients, shared by the summary and the cluster scan
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+# Per-host throttles, shared by every client talking to the same Rancher host
+_THROTTLES = {}
+_THROTTLES_LOCK = threading.Lock()
 
 # Hardcoded Harvester Lifecycles
 HARVESTER_LIFECYCLES = {
@@ -23,6 +62,42 @@ HARVESTER_LIFECYCLES = {
     "1.2": {"eom": "2024-07-08", "eol": "2024-09-08"} 
 }
 
+# Defaults for the optional top-level `settings:` block in config.yaml
+DEFAULT_SETTINGS = {
+    "max_parallel_instances": 4,
+    "max_parallel_clusters": 8,
+    "http_pool_size": 10,
+    "bulk_node_lookup": True,
+    "page_size": 1000,
+    "lifecycle_cache_dir": ".rancher-audit-cache",
+    "lifecycle_cache_ttl_hours": 24,
+    "instance_budget_seconds": 600,
+    "circuit_breaker_threshold": 3,
+    "max_retries": 3,
+    "retry_backoff_seconds": 0.5,
+    "max_requests_per_second": 20,
+    "min_concurrency": 1,
+    "target_latency_seconds": 2.0,
+    "excel_constant_memory": True,
+    "mermaid_layout": "auto",
+    "mermaid_node_threshold": 300,
+    "mermaid_collapse_clusters": False,
+    "incremental_audit": True,
+    "snapshot_file": ".rancher-audit-cache/last_audit.json",
+    "incremental_max_age_hours": 24,
+    "history_db": ".rancher-audit-cache/history.db",
+    "timing_report": "rancher_audit_timings.json",
+    "daemon_listen": "127.0.0.1:9180",
+    "daemon_interval_seconds": 900,
+    "stream_listings": True,
+    "harvester_version_cache": ".rancher-audit-cache/harvester_versions.json",
+    "harvester_version_ttl_hours": 24,
+    "harvester_probe_timeout_seconds": 5,
+}
+
+# Transient responses worth retrying with backoff
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
 def load_config(filepath="config.yaml"):
     if not os.path.exists(filepath):
         print(f"Error: Configuration file '{filepath}' not found.")
@@ -34,188 +109,1432 @@ def load_config(filepath="config.yaml"):
         print(f"Error parsing YAML file: {exc}")
         return None
 
-def parse_cpu(cpu_val):
-    if not cpu_val: return "0"
-    cpu_str = str(cpu_val)
-    if cpu_str.endswith('m'):
-        return str(round(int(cpu_str[:-1]) / 1000, 2))
-    return cpu_str
+def load_settings(config):
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update((config or {}).get('settings') or {})
+    return settings
 
-def parse_memory(mem_val):
-    if not mem_val: return "0 GiB"
-    mem_str = str(mem_val)
-    try:
-        if mem_str.endswith('Ki'):
-            return f"{round(int(mem_str[:-2]) / (1024**2), 2)} GiB"
-        elif mem_str.endswith('Mi'):
-            return f"{round(int(mem_str[:-2]) / 1024, 2)} GiB"
-        elif mem_str.endswith('Gi'):
-            return f"{mem_str[:-2]} GiB"
-        elif mem_str.isdigit(): 
-            return f"{round(int(mem_str) / (1024**3), 2)} GiB"
-    except Exception:
-        pass
-    return mem_str
+# ==========================================
+# CLUSTER CLASSIFICATION RULES
+# ==========================================
+
+# Rules are evaluated top to bottom and the first match wins. Each rule is
+# (label, [conditions]) and matches when ANY condition holds. A condition is
+# (column, op, value) with op one of: equals, in, contains, contains_any.
+CLOUD_IDENTIFIERS = ['eks', 'gke', 'aks', 'amazonec2', 'vsphere', 'azure', 'digitalocean', 'linode', 'amazonelasticcontainerservice']
+
+PROVIDER_RULES = [
+    ('Local', [('id', 'equals', 'local')]),
+    ('Imported', [('driver', 'contains', 'import'), ('provider', 'contains', 'import')]),
+    ('Harvester', [('driver', 'contains', 'harvester'), ('provider', 'contains', 'harvester')]),
+    ('Virtual', [('driver', 'contains_any', CLOUD_IDENTIFIERS), ('config_keys', 'contains_any', CLOUD_IDENTIFIERS)]),
+]
+DEFAULT_PROVIDER_TYPE = 'Custom'
+
+DISTRIBUTION_RULES = [
+    ('RKE2', [('git_version', 'contains', '+rke2')]),
+    ('K3s', [('git_version', 'contains', '+k3s')]),
+    ('AWS EKS', [('git_version', 'contains', '-eks'), ('driver', 'in', ['amazonelasticcontainerservice', 'eks'])]),
+    ('RKE1', [('driver', 'contains', 'rancherkubernetesengine')]),
+]
+DEFAULT_DISTRIBUTION = 'Upstream/Other'
+
+# Allocatable memory suffixes, as multipliers to GiB ('' is plain bytes)
+MEMORY_UNITS_GIB = {'Ki': 1 / 1024**2, 'Mi': 1 / 1024, 'Gi': 1, 'Ti': 1024, '': 1 / 1024**3}
+
+# Provider config blocks (eksConfig, ...) are reduced to the region, the only field read from them
+CLUSTER_FIELDS = ['id', 'name', 'driver', 'provider', 'version', 'allocatable', 'state', 'connected']
+
+# Listing states in which Rancher has lost the cluster agent, so proxied API calls cannot succeed
+DISCONNECTED_STATES = ['unavailable', 'disconnected']
+
+def trim_cluster(cluster):
+    """Keeps only the /v3/clusters fields the classifiers and enrichment read."""
+    trimmed = {key: cluster[key] for key in CLUSTER_FIELDS if key in cluster}
+    if isinstance(trimmed.get('version'), dict):
+        trimmed['version'] = {k: v for k, v in trimmed['version'].items() if k == 'gitVersion'}
+    conditions = [{'type': c.get('type'), 'status': c.get('status')} for c in cluster.get('conditions') or []
+                  if isinstance(c, dict) and c.get('type') == 'Connected']
+    if conditions:
+        trimmed['conditions'] = conditions
+    for key, block in cluster.items():
+        if key.lower().endswith('config'):
+            trimmed[key] = {'region': block.get('region', '')} if isinstance(block, dict) else block
+    return trimmed
+
+def cluster_connected(cluster):
+    """False when the listing already shows Rancher has no connection to the cluster's agent."""
+    if cluster.get('connected') is False:
+        return False
+    if (cluster.get('state') or '').lower() in DISCONNECTED_STATES:
+        return False
+    return not any(c.get('type') == 'Connected' and str(c.get('status')).lower() == 'false'
+                   for c in cluster.get('conditions') or [] if isinstance(c, dict))
+
+def cluster_fingerprint(cluster):
+    """Content hash of the cluster fields that feed the audit; status chatter does not change it."""
+    relevant = {k: v for k, v in cluster.items()
+                if k in ['id', 'name', 'driver', 'provider', 'version', 'allocatable'] or k.lower().endswith('config')}
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True, default=str).encode()).hexdigest()
+
+def load_cluster_table(clusters):
+    """Flattens one page of raw /v3/clusters records into the columns the classifiers read."""
+    import pandas as pd
+    columns = {name: [] for name in ['id', 'name', 'driver', 'provider', 'config_keys', 'git_version',
+                                     'config_region', 'cpu', 'memory', 'pods', 'fingerprint', 'connected']}
+    for cluster in clusters:
+        allocatable = cluster.get('allocatable') or {}
+        region = ""
+        for key in ['amazonElasticContainerServiceConfig', 'eksConfig']:
+            if cluster.get(key):
+                region = cluster[key].get('region', '')
+
+        columns['id'].append(cluster.get('id', ''))
+        columns['name'].append(cluster.get('name', 'Unknown'))
+        columns['driver'].append((cluster.get('driver') or '').lower())
+        columns['provider'].append((cluster.get('provider') or '').lower())
+        columns['config_keys'].append(" ".join(k.lower() for k in cluster if k.lower().endswith('config')))
+        columns['git_version'].append((cluster.get('version') or {}).get('gitVersion', 'N/A'))
+        columns['config_region'].append(region)
+        columns['cpu'].append(str(allocatable.get('cpu') or '0'))
+        columns['memory'].append(str(allocatable.get('memory') or '0'))
+        columns['pods'].append(str(allocatable.get('pods') or '0'))
+        columns['fingerprint'].append(cluster_fingerprint(cluster))
+        columns['connected'].append(cluster_connected(cluster))
+    return pd.DataFrame(columns)
+
+def _rule_mask(table, column, op, value):
+    col = table[column]
+    if op == 'equals':
+        return col == value
+    if op == 'in':
+        return col.isin(value)
+    if op == 'contains':
+        return col.str.contains(value, regex=False)
+    if op == 'contains_any':
+        return col.str.contains("|".join(re.escape(v) for v in value), regex=True)
+    raise ValueError(f"Unknown rule operator: {op}")
+
+def apply_rules(table, rules, default):
+    """Labels every row with the first matching rule, as whole-column boolean operations."""
+    import pandas as pd
+    labels = pd.Series(default, index=table.index, dtype=object)
+    unmatched = pd.Series(True, index=table.index)
+    for label, conditions in rules:
+        mask = pd.Series(False, index=table.index)
+        for column, op, value in conditions:
+            mask |= _rule_mask(table, column, op, value)
+        labels[mask & unmatched] = label
+        unmatched &= ~mask
+    return labels
+
+def parse_cpu_column(cpu):
+    """Allocatable CPU quantities ('3500m', '8') to cores; unparseable values become NaN."""
+    import pandas as pd
+    milli = cpu.str.endswith('m')
+    value = pd.to_numeric(cpu.str.replace(r'm$', '', regex=True), errors='coerce')
+    return value.where(~milli, value / 1000).round(2)
+
+def parse_memory_column(memory):
+    """Allocatable memory quantities ('16384000Ki', '32Gi', bytes) to GiB; unparseable values become NaN."""
+    import pandas as pd
+    parts = memory.str.extract(r'^(\d+(?:\.\d+)?)(Ki|Mi|Gi|Ti)?$')
+    factor = parts[1].fillna('').map(MEMORY_UNITS_GIB)
+    return (pd.to_numeric(parts[0], errors='coerce') * factor).round(2)
+
+def classify_clusters(table):
+    """Adds provider type, distribution, parsed capacity and K8s status columns to a cluster table."""
+    import pandas as pd
+    table['provider_type'] = apply_rules(table, PROVIDER_RULES, DEFAULT_PROVIDER_TYPE)
+    table['k8s_distribution'] = apply_rules(table, DISTRIBUTION_RULES, DEFAULT_DISTRIBUTION)
+    table['cpu_cores'] = parse_cpu_column(table['cpu'])
+    table['memory_gib'] = parse_memory_column(table['memory'])
+    table['pods'] = pd.to_numeric(table['pods'], errors='coerce')
+
+    # Only a handful of distinct versions exist, so evaluate each once and map it over the column
+    index = get_lifecycle_index()
+    statuses = {v: index.status("k8s", v) for v in table['git_version'].unique()}
+    table['k8s_status'] = table['git_version'].map(lambda v: statuses[v][0])
+    table['k8s_detail'] = table['git_version'].map(lambda v: statuses[v][1])
+    return table
+
+class ClusterFilter:
+    """Cluster selection from --cluster / --provider.
+
+    Name patterns are globs matched against the whole name, or regexes (searched anywhere in the
+    name) when prefixed with 're:'. When every pattern is an exact name they are pushed down to
+    Rancher as `name=` query filters; everything is also matched locally, after classification
+    and before any per-cluster enrichment.
+    """
+
+    def __init__(self, patterns=None, providers=None):
+        self.patterns = list(patterns or [])
+        self.providers = {p.lower() for p in providers or []}
+        # fnmatch.translate only anchors the end, so globs are checked with match() and regexes with search()
+        self._matchers = [re.compile(p[3:]).search if p.startswith('re:') else re.compile(fnmatch.translate(p)).match
+                          for p in self.patterns]
+
+    def query_filters(self):
+        """Query strings to list instead of the whole collection, or [""] when a full sweep is needed."""
+        filters = []
+        for pattern in self.patterns:
+            if pattern.startswith('re:') or any(c in pattern for c in '*?['):
+                return [""]
+            filters.append(f"name={quote(pattern)}")
+        return filters or [""]
+
+    @property
+    def pushed_down(self):
+        return self.query_filters() != [""]
+
+    def apply(self, table):
+        keep = table['name'].map(lambda name: any(m(name) for m in self._matchers)) if self._matchers else None
+        if self.providers:
+            by_provider = table['provider_type'].str.lower().isin(self.providers)
+            keep = by_provider if keep is None else keep & by_provider
+        return table if keep is None else table[keep]
+
+def _optional_number(value, cast=float):
+    import pandas as pd
+    return None if pd.isna(value) else cast(value)
+
+# ==========================================
+# INVENTORY MODEL
+# ==========================================
+
+class _Record:
+    """Base for the slotted inventory records: keyword construction and a plain-dict view for sinks."""
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class ServerRecord(_Record):
+    __slots__ = ("name", "url", "rancher_version", "rancher_status", "k8s_version", "k8s_status",
+                 "aws_region", "backup_operator", "comment")
+
+class ClusterRecord(_Record):
+    __slots__ = ("server", "name", "provider_type", "k8s_distribution", "k8s_version", "k8s_status",
+                 "cpu_arch", "region", "region_status", "cpu_cores", "memory_gib", "pods", "comments")
+
+class HarvesterRecord(_Record):
+    __slots__ = ("server", "name", "harvester_version", "harvester_status", "k8s_version", "k8s_status",
+                 "cpu_arch", "comments")
+
+def get_region_status(cluster_region, parent_region):
+    if cluster_region in ["N/A", "Unknown", ""] or parent_region in ["N/A", "Unknown", ""]:
+        return "Unknown"
+    elif cluster_region == parent_region:
+        return "Green"
+    return "Red"
+
+def group_by_server(records):
+    """Groups records by server in one pass, keeping servers in first-seen order."""
+    groups = {}
+    for record in records:
+        groups.setdefault(record.server, []).append(record)
+    return groups
+
+class Inventory:
+    """The audit result every output writer reads: servers, downstream and Harvester records.
+
+    Region compliance is resolved once here, against an index of servers by name.
+    """
+    __slots__ = ("servers", "downstream", "harvester", "servers_by_name")
+
+    def __init__(self, servers, downstream, harvester):
+        self.servers = servers
+        self.downstream = downstream
+        self.harvester = harvester
+        self.servers_by_name = {server.name: server for server in servers}
+        for cluster in downstream:
+            parent = self.servers_by_name.get(cluster.server)
+            cluster.region_status = get_region_status(cluster.region, parent.aws_region if parent else "N/A")
 
 # ==========================================
 # LIFECYCLE DATA FETCHERS & EVALUATORS
 # ==========================================
 
-def fetch_k8s_lifecycles():
-    global _K8S_LIFECYCLES
-    if _K8S_LIFECYCLES is not None:
-        return _K8S_LIFECYCLES
+def configure_lifecycle_cache(cache_dir=None, ttl_hours=None, offline=None):
+    if cache_dir is not None:
+        _LIFECYCLE_CACHE["dir"] = cache_dir
+    if ttl_hours is not None:
+        _LIFECYCLE_CACHE["ttl_hours"] = float(ttl_hours)
+    if offline is not None:
+        _LIFECYCLE_CACHE["offline"] = bool(offline)
+
+def _lifecycle_cache_path(product):
+    return os.path.join(_LIFECYCLE_CACHE["dir"], f"{product}.json")
+
+def read_lifecycle_cache(product):
+    try:
+        with open(_lifecycle_cache_path(product), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_lifecycle_cache(product, entry):
+    path = _lifecycle_cache_path(product)
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Warning: Could not write lifecycle cache {path}: {e}")
+
+def load_lifecycle_data(product, label):
+    """Returns the raw endoflife.date cycle list for a product, from the replay archive when replaying."""
+    if API_ARCHIVE.replaying:
+        return API_ARCHIVE.lifecycle(product)
+    data = fetch_lifecycle_data(product, label)
+    API_ARCHIVE.record_lifecycle(product, data)
+    return data
+
+def fetch_lifecycle_data(product, label):
+    """Returns the raw endoflife.date cycle list for a product, served from the on-disk cache when possible.
+
+    Fresh entries are used as-is. Stale entries are revalidated with ETag / If-Modified-Since,
+    and are still served if endoflife.date cannot be reached. Offline mode never touches the network.
+    """
+    entry = read_lifecycle_cache(product)
+    age_hours = (time.time() - entry.get("fetched_at", 0)) / 3600 if entry else None
+
+    if entry and (_LIFECYCLE_CACHE["offline"] or age_hours < _LIFECYCLE_CACHE["ttl_hours"]):
+        return entry["data"]
+    if _LIFECYCLE_CACHE["offline"]:
+        raise RuntimeError(f"offline mode and no cached {product} data in {_LIFECYCLE_CACHE['dir']}")
+
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
     try:
-        print("🌐 Fetching dynamic Kubernetes lifecycle data from endoflife.date...")
-        resp = requests.get("https://endoflife.date/api/kubernetes.json", timeout=10)
+        log_line(f"🌐 Fetching dynamic {label} lifecycle data from endoflife.date...")
+        started = time.monotonic()
+        resp = requests.get(LIFECYCLE_API.format(product=product), headers=headers, timeout=10)
+        METRICS.record_request("endoflife.date", resp.url, time.monotonic() - started, len(resp.content), resp.status_code)
+        if resp.status_code == 304 and entry:
+            entry["fetched_at"] = time.time()
+            write_lifecycle_cache(product, entry)
+            return entry["data"]
         resp.raise_for_status()
-        _K8S_LIFECYCLES = {item['cycle']: item['eol'] for item in resp.json()}
+        entry = {
+            "fetched_at": time.time(),
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "data": resp.json(),
+        }
+        write_lifecycle_cache(product, entry)
+        return entry["data"]
     except Exception as e:
-        print(f"⚠️ Warning: Could not fetch K8s lifecycle data: {e}")
-        _K8S_LIFECYCLES = {} 
-    return _K8S_LIFECYCLES
+        if entry:
+            log_line(f"⚠️ Warning: Using cached {label} lifecycle data ({age_hours:.0f}h old): {e}")
+            return entry["data"]
+        raise
+
+def seed_lifecycle_cache(snapshot_path):
+    """Loads a snapshot written by export_lifecycle_snapshot into the on-disk cache (for air-gapped runners).
+
+    Nothing is written unless the snapshot holds data for every product. Returns False on failure.
+    """
+    try:
+        with open(snapshot_path, 'r') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error reading lifecycle snapshot {snapshot_path}: {e}")
+        return False
+    missing = [p for p in LIFECYCLE_PRODUCTS if not isinstance(snapshot.get(p), dict) or not snapshot[p].get("data")]
+    if missing:
+        print(f"❌ Error: Lifecycle snapshot {snapshot_path} has no data for: {', '.join(missing)}")
+        return False
+    for product in LIFECYCLE_PRODUCTS:
+        write_lifecycle_cache(product, snapshot[product])
+    print(f"✅ Lifecycle cache seeded from: {snapshot_path}")
+    return True
+
+def export_lifecycle_snapshot(snapshot_path):
+    """Refreshes the cache for every product (read-only with --offline) and writes it to a snapshot file.
+
+    Returns False, without writing, if any product could not be fetched or found in the cache.
+    """
+    labels = {"kubernetes": "Kubernetes", "rancher": "Rancher"}
+    missing = []
+    for product in LIFECYCLE_PRODUCTS:
+        try:
+            fetch_lifecycle_data(product, labels.get(product, product))
+        except Exception as e:
+            print(f"⚠️ Could not refresh {product} lifecycle data: {e}")
+        if not read_lifecycle_cache(product):
+            missing.append(product)
+    if missing:
+        print(f"❌ Error: No lifecycle data for {', '.join(missing)}; snapshot not written.")
+        return False
+
+    snapshot = {product: read_lifecycle_cache(product) for product in LIFECYCLE_PRODUCTS}
+    with open(snapshot_path, 'w') as f:
+        json.dump(snapshot, f, indent=2)
+    print(f"✅ Lifecycle snapshot saved: {snapshot_path}")
+    return True
+
+def fetch_k8s_lifecycles():
+    global _K8S_LIFECYCLES
+    with _LIFECYCLE_LOCK:
+        if _K8S_LIFECYCLES is not None:
+            return _K8S_LIFECYCLES
+        try:
+            data = load_lifecycle_data("kubernetes", "Kubernetes")
+            _K8S_LIFECYCLES = {item['cycle']: item['eol'] for item in data}
+        except Exception as e:
+            log_line(f"⚠️ Warning: Could not fetch K8s lifecycle data: {e}")
+            _K8S_LIFECYCLES = {} 
+        return _K8S_LIFECYCLES
 
 def fetch_rancher_lifecycles():
     global _RANCHER_LIFECYCLES
-    if _RANCHER_LIFECYCLES is not None:
+    with _LIFECYCLE_LOCK:
+        if _RANCHER_LIFECYCLES is not None:
+            return _RANCHER_LIFECYCLES
+        try:
+            data = load_lifecycle_data("rancher", "Rancher")
+            _RANCHER_LIFECYCLES = {}
+            for item in data:
+                eol = item.get('eol', '2000-01-01')
+                eom = item.get('support')
+                if not isinstance(eom, str):
+                    eol_date = datetime.strptime(eol, "%Y-%m-%d").date()
+                    eom = (eol_date - timedelta(days=60)).strftime("%Y-%m-%d")
+                _RANCHER_LIFECYCLES[item['cycle']] = {"eol": eol, "eom": eom}
+        except Exception as e:
+            log_line(f"⚠️ Warning: Could not fetch Rancher lifecycle data: {e}")
+            _RANCHER_LIFECYCLES = {} 
         return _RANCHER_LIFECYCLES
+
+K8S_MINOR_RE = re.compile(r'v?(1\.\d+)')
+RANCHER_MINOR_RE = re.compile(r'v?(2\.\d+)')
+HARVESTER_MINOR_RE = re.compile(r'v?(1\.\d+)')
+
+def _parse_date(value):
     try:
-        print("🌐 Fetching dynamic Rancher lifecycle data from endoflife.date...")
-        resp = requests.get("https://endoflife.date/api/rancher.json", timeout=10)
-        resp.raise_for_status()
-        _RANCHER_LIFECYCLES = {}
-        for item in resp.json():
-            eol = item.get('eol', '2000-01-01')
-            eom = item.get('support')
-            if not isinstance(eom, str):
-                eol_date = datetime.strptime(eol, "%Y-%m-%d").date()
-                eom = (eol_date - timedelta(days=60)).strftime("%Y-%m-%d")
-            _RANCHER_LIFECYCLES[item['cycle']] = {"eol": eol, "eom": eom}
-    except Exception as e:
-        print(f"⚠️ Warning: Could not fetch Rancher lifecycle data: {e}")
-        _RANCHER_LIFECYCLES = {} 
-    return _RANCHER_LIFECYCLES
-
-def get_k8s_version_status(version_str, cluster_name="Unknown"):
-    if not version_str or version_str in ["Unknown", "N/A"]: return "Unknown"
-    match = re.search(r'v?(1\.\d+)', str(version_str))
-    if not match: return "Unknown"
-    minor_version = match.group(1)
-    lifecycles = fetch_k8s_lifecycles()
-    
-    if not lifecycles or minor_version not in lifecycles:
-        try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+class LifecycleIndex:
+    """Lifecycle dates for K8s, Rancher and Harvester, parsed once and evaluated against a single "as of" date.
+
+    Statuses are memoized per (product, version string), so a fleet of thousands of clusters
+    only evaluates each distinct version once.
+    """
+
+    def __init__(self, k8s_lifecycles, rancher_lifecycles, harvester_lifecycles, as_of=None):
+        self.as_of = as_of or datetime.now().date()
+        self.k8s = {}
+        for cycle, eol in k8s_lifecycles.items():
+            eol_date = _parse_date(eol)
+            if eol_date:
+                self.k8s[cycle] = {"eol": eol_date, "warning": eol_date - timedelta(days=60)}
+        self.rancher = self._parse_eom_eol(rancher_lifecycles)
+        self.harvester = self._parse_eom_eol(harvester_lifecycles)
+        self._memo = {}
+
+    @staticmethod
+    def _parse_eom_eol(lifecycles):
+        parsed = {}
+        for cycle, dates in lifecycles.items():
+            eol_date = _parse_date(dates.get("eol"))
+            eom_date = _parse_date(dates.get("eom"))
+            if eol_date and eom_date:
+                parsed[cycle] = {"eol": eol_date, "eom": eom_date}
+        return parsed
+
+    @classmethod
+    def build(cls, as_of=None):
+        with METRICS.phase("lifecycle"):
+            return cls(fetch_k8s_lifecycles(), fetch_rancher_lifecycles(), HARVESTER_LIFECYCLES, as_of)
+
+    def status(self, product, version_str):
+        """Returns (status, detail) for a version string; detail is a short human-readable reason."""
+        key = (product, version_str)
+        if key not in self._memo:
+            self._memo[key] = self._evaluate(product, version_str)
+        return self._memo[key]
+
+    def _evaluate(self, product, version_str):
+        if version_str == "Unreachable": return "Unreachable", ""
+        if not version_str or version_str in ["Unknown", "N/A"]: return "Unknown", ""
+        if product == "k8s":
+            regex, lifecycles, too_old, brand_new = K8S_MINOR_RE, self.k8s, 28, 34
+        elif product == "rancher":
+            regex, lifecycles, too_old, brand_new = RANCHER_MINOR_RE, self.rancher, 8, 12
+        else:
+            regex, lifecycles, too_old, brand_new = HARVESTER_MINOR_RE, self.harvester, 4, 8
+
+        match = regex.search(str(version_str))
+        if not match: return "Unknown", ""
+        minor_version = match.group(1)
+
+        if minor_version not in lifecycles:
             minor_num = int(minor_version.split('.')[1])
-            if minor_num < 28: 
-                print(f"    -> 🟥 [RED] K8s Cluster {cluster_name} (Version {version_str} is extremely old)")
-                return "Red" 
-            elif minor_num >= 34: 
-                print(f"    -> 🟩 [GREEN] K8s Cluster {cluster_name} (Version {version_str} is brand new)")
-                return "Green" 
-        except Exception: pass
-        return "Unknown"
-        
-    today = datetime.now().date()
-    eol_date = datetime.strptime(lifecycles[minor_version], "%Y-%m-%d").date()
-    warning_date = eol_date - timedelta(days=60)
-    
-    if today >= eol_date:
-        print(f"    -> 🟥 [RED] K8s Cluster {cluster_name} (Version {version_str} passed EOL on {eol_date})")
-        return "Red"
-    elif today >= warning_date:
-        print(f"    -> 🟨 [YELLOW] K8s Cluster {cluster_name} (Version {version_str} entered warning window on {warning_date})")
-        return "Yellow"
-    else:
-        print(f"    -> 🟩 [GREEN] K8s Cluster {cluster_name} (Version {version_str} is supported)")
-        return "Green"
+            if minor_num < too_old:
+                return "Red", "is extremely old"
+            elif minor_num >= brand_new:
+                return "Green", "is brand new"
+            return "Unknown", ""
+
+        dates = lifecycles[minor_version]
+        if self.as_of >= dates["eol"]:
+            return "Red", f"passed EOL on {dates['eol']}"
+        if "warning" in dates and self.as_of >= dates["warning"]:
+            return "Yellow", f"entered warning window on {dates['warning']}"
+        if "eom" in dates and self.as_of >= dates["eom"]:
+            return "Yellow", f"passed EOM on {dates['eom']}"
+        return "Green", "is supported"
+
+_LIFECYCLE_INDEX = None
+_LIFECYCLE_AS_OF = None
+
+def set_lifecycle_as_of(as_of):
+    """Evaluates every status against `as_of` (a date) instead of today, e.g. for upgrade planning."""
+    global _LIFECYCLE_INDEX, _LIFECYCLE_AS_OF
+    with _LIFECYCLE_LOCK:
+        _LIFECYCLE_AS_OF = as_of
+        _LIFECYCLE_INDEX = None
+
+def reset_lifecycle_index():
+    """Drops the in-memory lifecycle data so the next lookup reloads it (through the on-disk cache)."""
+    global _K8S_LIFECYCLES, _RANCHER_LIFECYCLES, _LIFECYCLE_INDEX
+    with _LIFECYCLE_LOCK:
+        _K8S_LIFECYCLES = None
+        _RANCHER_LIFECYCLES = None
+        _LIFECYCLE_INDEX = None
+
+def get_lifecycle_index():
+    global _LIFECYCLE_INDEX
+    if _LIFECYCLE_INDEX is None:
+        index = LifecycleIndex.build(_LIFECYCLE_AS_OF)
+        with _LIFECYCLE_LOCK:
+            if _LIFECYCLE_INDEX is None:
+                _LIFECYCLE_INDEX = index
+    return _LIFECYCLE_INDEX
+
+_LOG_LOCK = threading.Lock()
+
+def log_line(message, instance=None):
+    """Prints one status line tagged with its instance, in a single write.
+
+    Instances are scanned concurrently, so a bare print() can splice two threads' lines together.
+    """
+    if instance:
+        body = message.lstrip("\n")
+        message = f"{message[:len(message) - len(body)]}[{instance}] {body.lstrip()}"
+    with _LOG_LOCK:
+        print(message + "\n", end="", flush=True)
+
+def log_k8s_status(cluster_name, version_str, status, detail, instance=None):
+    if status == "Red":
+        log_line(f"    -> 🟥 [RED] K8s Cluster {cluster_name} (Version {version_str} {detail})", instance)
+    elif status == "Yellow":
+        log_line(f"    -> 🟨 [YELLOW] K8s Cluster {cluster_name} (Version {version_str} {detail})", instance)
+    elif status == "Green":
+        log_line(f"    -> 🟩 [GREEN] K8s Cluster {cluster_name} (Version {version_str} {detail})", instance)
+
+def get_k8s_version_status(version_str, cluster_name="Unknown", instance=None):
+    status, detail = get_lifecycle_index().status("k8s", version_str)
+    log_k8s_status(cluster_name, version_str, status, detail, instance)
+    return status
 
 def get_rancher_version_status(version_str, server_name="Unknown"):
-    if not version_str or version_str in ["Unknown", "N/A"]: return "Unknown"
-    match = re.search(r'v?(2\.\d+)', str(version_str))
-    if not match: return "Unknown"
-    minor_version = match.group(1)
-    lifecycles = fetch_rancher_lifecycles()
-    
-    if not lifecycles or minor_version not in lifecycles:
-        try:
-            minor_num = int(minor_version.split('.')[1])
-            if minor_num < 8: 
-                return "Red" 
-            elif minor_num >= 12: 
-                return "Green" 
-        except Exception: pass
-        return "Unknown"
-        
-    today = datetime.now().date()
-    eol_date = datetime.strptime(lifecycles[minor_version]["eol"], "%Y-%m-%d").date()
-    eom_date = datetime.strptime(lifecycles[minor_version]["eom"], "%Y-%m-%d").date()
-    
-    if today >= eol_date:
-        return "Red"
-    elif today >= eom_date:
-        return "Yellow"
-    else:
-        return "Green"
+    return get_lifecycle_index().status("rancher", version_str)[0]
 
 def get_harvester_version_status(version_str, cluster_name="Unknown"):
-    if not version_str or version_str in ["Unknown", "N/A"]: return "Unknown"
-    match = re.search(r'v?(1\.\d+)', str(version_str))
-    if not match: return "Unknown"
-    minor_version = match.group(1)
-    
-    if minor_version not in HARVESTER_LIFECYCLES:
+    return get_lifecycle_index().status("harvester", version_str)[0]
+
+# ==========================================
+# INSTRUMENTATION
+# ==========================================
+
+# Upper bounds (seconds) of the request latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+def endpoint_template(url):
+    """Collapses cluster ids out of a URL path so requests group by call site."""
+    path = urlparse(url).path
+    return re.sub(r'^/(v3|k8s)/clusters/(?!local(?:/|$))[^/]+', r'/\1/clusters/{id}', path)
+
+def response_size(resp):
+    return len(resp.content) if resp is not None else 0
+
+class Metrics:
+    """Request counts, bytes and latency histograms per instance and endpoint, plus phase timings.
+
+    Phase times are summed across worker threads, so concurrent phases can add up to more
+    than the wall-clock time of the run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.requests = {}
+        self.phases = {}
+
+    def record_request(self, instance, url, seconds, size, status):
+        key = (instance, endpoint_template(url))
+        with self._lock:
+            entry = self.requests.get(key)
+            if entry is None:
+                entry = self.requests[key] = {"count": 0, "errors": 0, "bytes": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                              "buckets": [0] * (len(LATENCY_BUCKETS) + 1)}
+            entry["count"] += 1
+            entry["bytes"] += size
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            if status is None or status >= 400:
+                entry["errors"] += 1
+            bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+            entry["buckets"][bucket] += 1
+
+    @contextmanager
+    def phase(self, name):
+        started = time.monotonic()
         try:
-            minor_num = int(minor_version.split('.')[1])
-            if minor_num < 4: 
-                return "Red"
-            elif minor_num >= 8:
-                return "Green" 
-        except Exception: pass
-        return "Unknown"
-        
-    today = datetime.now().date()
-    eol_date = datetime.strptime(HARVESTER_LIFECYCLES[minor_version]["eol"], "%Y-%m-%d").date()
-    eom_date = datetime.strptime(HARVESTER_LIFECYCLES[minor_version]["eom"], "%Y-%m-%d").date()
-    
-    if today >= eol_date:
-        return "Red"
-    elif today >= eom_date:
-        return "Yellow"
-    else:
-        return "Green"
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                entry = self.phases.setdefault(name, {"calls": 0, "seconds": 0.0})
+                entry["calls"] += 1
+                entry["seconds"] += elapsed
+
+    @staticmethod
+    def _percentile_bound(buckets, fraction):
+        target, seen = sum(buckets) * fraction, 0
+        for bound, count in zip(LATENCY_BUCKETS + [float("inf")], buckets):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "wall_seconds": round(time.monotonic() - self.started, 3),
+                "phases": {name: {"calls": p["calls"], "seconds": round(p["seconds"], 3)} for name, p in self.phases.items()},
+                "requests": [
+                    {"instance": instance, "endpoint": endpoint, "count": e["count"], "errors": e["errors"],
+                     "bytes": e["bytes"], "seconds": round(e["seconds"], 3), "max_seconds": round(e["max_seconds"], 3),
+                     "histogram": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], e["buckets"]))}
+                    for (instance, endpoint), e in sorted(self.requests.items())
+                ],
+            }
+
+    def report(self, filename=None):
+        if not self.requests and not self.phases:
+            return
+        print(f"\n⏱️ Phase timings (thread-seconds; run wall clock {time.monotonic() - self.started:.2f}s):")
+        for name, p in sorted(self.phases.items(), key=lambda item: -item[1]["seconds"]):
+            print(f"    {name:<16} {p['seconds']:>9.3f}s  {p['calls']:>7} calls")
+        if self.requests:
+            print("🌐 Requests by instance and endpoint:")
+            for (instance, endpoint), e in sorted(self.requests.items(), key=lambda item: -item[1]["seconds"]):
+                p95 = self._percentile_bound(e["buckets"], 0.95)
+                p95_label = "> 10s" if p95 == float("inf") else f"≤ {p95 * 1000:g}ms"
+                print(f"    [{instance}] {endpoint}: {e['count']} req ({e['errors']} failed), "
+                      f"{e['bytes'] / 1024:.1f} KiB, avg {e['seconds'] / e['count'] * 1000:.0f}ms, "
+                      f"p95 {p95_label}, max {e['max_seconds'] * 1000:.0f}ms")
+        if filename:
+            try:
+                with open(filename, 'w') as f:
+                    json.dump(self.as_dict(), f, indent=2)
+                print(f"✅ Timing report saved: {filename}")
+            except OSError as e:
+                print(f"⚠️ Warning: Could not write timing report {filename}: {e}")
+
+METRICS = Metrics()
+
+# ==========================================
+# HTTP CLIENT
+# ==========================================
+
+def parse_collection_stream(chunks, trim):
+    """Incrementally parses a Rancher collection body from byte chunks.
+
+    Only one raw item is held at a time: each element of `data` is decoded, passed through
+    `trim` and dropped, so peak memory follows the trimmed page rather than the full response.
+    Returns (items, pagination).
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    state = {"buf": "", "pos": 0, "eof": False}
+
+    def fill():
+        if state["eof"]:
+            return False
+        chunk = next(chunks, None)
+        if chunk is None:
+            state["eof"] = True
+            state["buf"] += text.decode(b"", final=True)
+            return True
+        # Drop what has been consumed so the buffer never holds more than the current item
+        state["buf"] = state["buf"][state["pos"]:] + text.decode(chunk)
+        state["pos"] = 0
+        return True
+
+    def peek():
+        while True:
+            buf, pos = state["buf"], state["pos"]
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            state["pos"] = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                raise ValueError("unexpected end of collection response")
+
+    def expect(char):
+        if peek() != char:
+            raise ValueError(f"expected {char!r} in collection response")
+        state["pos"] += 1
+
+    def value():
+        peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(state["buf"], state["pos"])
+                # A value touching the end of the buffer may be cut short (e.g. "1.5e" of
+                # "1.5e10"), so only accept it once the delimiter after it has arrived
+                if state["eof"] or (end < len(state["buf"]) and state["buf"][end] in " \t\r\n,:]}"):
+                    state["pos"] = end
+                    return obj
+            except json.JSONDecodeError:
+                if state["eof"]:
+                    raise
+            fill()
+
+    items, pagination = [], None
+    expect("{")
+    while peek() != "}":
+        key = value()
+        expect(":")
+        if key == "data" and peek() == "[":
+            expect("[")
+            while peek() != "]":
+                items.append(trim(value()))
+                if peek() == ",":
+                    expect(",")
+            expect("]")
+        else:
+            val = value()
+            if key == "pagination":
+                pagination = val
+        if peek() == ",":
+            expect(",")
+    return items, pagination
+
+class InstanceUnreachable(requests.exceptions.RequestException):
+    """Raised without touching the network once an instance's circuit is open or its time budget is spent."""
+
+class ResponseCache:
+    """Per-run cache of GET responses keyed by instance and URL.
+
+    Concurrent callers asking for the same key share one in-flight request. Requests that raise,
+    and transient 429/5xx responses that outlived their retries, are not kept, so a later caller
+    can try again; other responses, 404s included, are a definitive answer for the run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def fetch(self, key, fetch_fn):
+        with self._lock:
+            future = self._entries.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._entries[key] = future
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if owner:
+            try:
+                resp = fetch_fn()
+            except Exception as e:
+                with self._lock:
+                    self._entries.pop(key, None)
+                future.set_exception(e)
+            else:
+                if resp.status_code in RETRY_STATUS_CODES:
+                    with self._lock:
+                        self._entries.pop(key, None)
+                future.set_result(resp)
+        return future.result()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def report(self):
+        if self.hits or self.misses:
+            print(f"📦 Response cache: {self.hits} hits, {self.misses} misses")
+
+RESPONSE_CACHE = ResponseCache()
+
+class ApiArchive:
+    """Records every Rancher and lifecycle response of a run into a gzipped JSON archive, or replays one.
+
+    Responses are keyed by instance name and URL, so replay does not depend on request order.
+    The archive also keeps the instances (without tokens), the scan settings that shape URLs,
+    and the recording date, which replay uses as the lifecycle "as of" date.
+    """
+
+    # Settings that change which URLs are requested; replay must use the recorded values
+    SCAN_SETTINGS = ["page_size", "bulk_node_lookup"]
+
+    def __init__(self):
+        self.mode = None
+        self.path = None
+        self.data = {}
+        self._lock = threading.Lock()
+
+    @property
+    def recording(self):
+        return self.mode == "record"
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def start_recording(self, path, instances, settings):
+        self.mode, self.path = "record", path
+        self.data = {
+            "version": 1,
+            "recorded_at": datetime.now().date().isoformat(),
+            "instances": [{k: v for k, v in i.items() if k != 'token'} for i in instances],
+            "settings": {k: settings[k] for k in self.SCAN_SETTINGS},
+            "responses": {},
+            "lifecycles": {},
+        }
+
+    def start_replay(self, path):
+        with gzip.open(path, 'rt') as f:
+            self.data = json.load(f)
+        self.mode, self.path = "replay", path
+        print(f"📼 Replaying recorded run from {path} ({self.data['recorded_at']}), no network access")
+
+    @property
+    def instances(self):
+        return [dict(i, token="") for i in self.data.get("instances", [])]
+
+    @property
+    def recorded_on(self):
+        return datetime.strptime(self.data["recorded_at"], "%Y-%m-%d").date()
+
+    def record(self, name, url, resp):
+        if not self.recording:
+            return
+        entry = {"status": resp.status_code, "body": resp.text,
+                 "headers": {k: v for k, v in resp.headers.items() if k.lower() in ['content-type', 'retry-after']}}
+        with self._lock:
+            self.data["responses"].setdefault(name, {})[url] = entry
+
+    def record_error(self, name, url, error):
+        if not self.recording:
+            return
+        with self._lock:
+            self.data["responses"].setdefault(name, {})[url] = {"error": type(error).__name__, "message": str(error)}
+
+    def replay(self, client, url, probe=False):
+        """Serves a recorded response, feeding the client's breaker the same way the live request did."""
+        entry = self.data["responses"].get(client.name, {}).get(url)
+        if entry is None:
+            raise requests.exceptions.ConnectionError(f"{url} is not in the replay archive {self.path}")
+        if "error" in entry:
+            if entry["error"] == "InstanceUnreachable":
+                client.circuit_open = True
+                raise InstanceUnreachable(entry["message"])
+            if not probe:
+                client._record_connection_failure()
+            raise requests.exceptions.ConnectionError(entry["message"])
+        client._record_success()
+
+        resp = requests.Response()
+        resp.status_code = entry["status"]
+        resp._content = entry["body"].encode("utf-8")
+        resp._content_consumed = True
+        resp.encoding = "utf-8"
+        resp.headers = CaseInsensitiveDict(entry.get("headers") or {})
+        resp.url = url
+        return resp
+
+    def record_lifecycle(self, product, data):
+        if self.recording:
+            with self._lock:
+                self.data["lifecycles"][product] = data
+
+    def lifecycle(self, product):
+        if product not in self.data.get("lifecycles", {}):
+            raise RuntimeError(f"no {product} lifecycle data in the replay archive {self.path}")
+        return self.data["lifecycles"][product]
+
+    def save(self):
+        if not self.recording:
+            return
+        with gzip.open(self.path, 'wt') as f:
+            json.dump(self.data, f)
+        count = sum(len(r) for r in self.data["responses"].values())
+        print(f"📼 Recorded {count} API responses to {self.path}")
+
+API_ARCHIVE = ApiArchive()
+
+def parse_retry_after(resp):
+    """Returns the Retry-After delay in seconds (numeric or HTTP-date form), or None."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def is_rate_limited(resp):
+    """True for a 429, or a 503 carrying Retry-After: the Rancher server itself asking clients to back off."""
+    if resp is None:
+        return False
+    return resp.status_code == 429 or (resp.status_code == 503 and parse_retry_after(resp) is not None)
+
+class HostThrottle:
+    """Rate limiter and AIMD concurrency controller for one Rancher host.
+
+    Requests are spaced to stay under `max_requests_per_second`. The concurrency limit grows by
+    roughly one slot per window of healthy responses and halves on errors or responses slower than
+    `target_latency_seconds`. A Retry-After header pauses the whole host.
+    """
+
+    def __init__(self, settings=DEFAULT_SETTINGS):
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.limit = None
+        self.configure(settings)
+
+    def configure(self, settings):
+        with self._cond:
+            rps = float(settings["max_requests_per_second"] or 0)
+            self.interval = 1.0 / rps if rps > 0 else 0.0
+            self.max_concurrency = max(1, int(settings["max_parallel_clusters"]))
+            self.min_concurrency = max(1, min(int(settings["min_concurrency"]), self.max_concurrency))
+            self.target_latency = float(settings["target_latency_seconds"])
+            if self.limit is None:
+                self.limit = float(self.max_concurrency)
+            self.limit = min(max(self.limit, self.min_concurrency), self.max_concurrency)
+
+    def acquire(self, deadline):
+        """Blocks until a request may start; returns False if `deadline` passes first."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(timeout=min(remaining, 1.0))
+            now = time.monotonic()
+            start = max(now, self.next_slot, self.paused_until)
+            if start >= deadline:
+                return False
+            self.next_slot = start + self.interval
+            self.in_flight += 1
+        if start > now:
+            time.sleep(start - now)
+        return True
+
+    def release(self, latency, healthy, adapt=True):
+        """Frees a slot; with adapt=False the request says nothing about the host and the limit is left alone."""
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if not adapt:
+                pass
+            elif not healthy or latency > self.target_latency:
+                # Decrease at most once per latency window so one burst of errors doesn't collapse the limit
+                if now - self.last_decrease > self.target_latency:
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def pause(self, seconds):
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+def get_throttle(url, settings=DEFAULT_SETTINGS):
+    host = urlparse(url).netloc
+    with _THROTTLES_LOCK:
+        if host not in _THROTTLES:
+            _THROTTLES[host] = HostThrottle(settings)
+        return _THROTTLES[host]
+
+class RancherClient:
+    """One keep-alive requests.Session per Rancher instance, carrying the bearer token and TLS policy.
+
+    Each scan gets a time budget and a circuit breaker: after `circuit_breaker_threshold` consecutive
+    connection failures, or once the budget is spent, every further request fails fast with
+    InstanceUnreachable. Transient 429/5xx responses are retried with jittered exponential backoff.
+    """
+
+    def __init__(self, instance, pool_size=10):
+        self.name = instance['name']
+        self.base_url = instance['url'].rstrip('/')
+
+        # `verify` may be a bool or a CA bundle path; the rotation script writes it back quoted
+        verify = instance.get('verify', False)
+        if isinstance(verify, str) and verify.lower() in ['true', 'false']:
+            verify = verify.lower() == 'true'
+
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {instance['token']}"})
+        self.session.verify = verify
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._breaker_lock = threading.Lock()
+        self.throttle = get_throttle(self.base_url)
+        self.start_scan(DEFAULT_SETTINGS)
+
+    def start_scan(self, settings):
+        """Resets the circuit breaker and starts a fresh time budget for this instance."""
+        with self._breaker_lock:
+            self.deadline = time.monotonic() + float(settings["instance_budget_seconds"])
+            self.failure_threshold = int(settings["circuit_breaker_threshold"])
+            self.max_retries = int(settings["max_retries"])
+            self.retry_backoff = float(settings["retry_backoff_seconds"])
+            self.consecutive_failures = 0
+            self.circuit_open = False
+            self.had_success = False
+            self.connection_failed = False
+        self.stream_listings = bool(settings["stream_listings"])
+        self.throttle.configure(settings)
+
+    @property
+    def unreachable(self):
+        # A scan that failed to connect and never got an answer is as dead as a tripped breaker
+        if self.connection_failed and not self.had_success:
+            return True
+        return self.circuit_open or time.monotonic() >= self.deadline
+
+    def _record_success(self):
+        with self._breaker_lock:
+            self.consecutive_failures = 0
+            self.had_success = True
+
+    def _record_connection_failure(self):
+        with self._breaker_lock:
+            self.connection_failed = True
+            self.consecutive_failures += 1
+            if not self.circuit_open and self.consecutive_failures >= self.failure_threshold:
+                self.circuit_open = True
+                log_line(f"⛔ {self.consecutive_failures} consecutive connection failures, failing fast for the rest of this scan", self.name)
+
+    def _request(self, url, timeout, probe=False, **kwargs):
+        # Probes of downstream clusters fail fast: a silent, slow or failing cluster is not retried and
+        # neither counts against the breaker of the Rancher instance proxying it nor shrinks its
+        # throttle. Rate limiting by Rancher itself is still honoured like any other request.
+        retries = self.max_retries
+        for attempt in range(retries + 1):
+            if self.circuit_open:
+                raise InstanceUnreachable(f"{self.name}: circuit open, skipping {url}")
+            if not self.throttle.acquire(self.deadline):
+                raise InstanceUnreachable(f"{self.name}: time budget exhausted, skipping {url}")
+
+            started = time.monotonic()
+            healthy = False
+            resp = None
+            try:
+                resp = self.session.get(url, timeout=min(timeout, max(self.deadline - started, 0.1)), **kwargs)
+                healthy = resp.status_code not in RETRY_STATUS_CODES
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not probe:
+                    self._record_connection_failure()
+                raise
+            finally:
+                settle = self._settler(url, started, healthy, probe, resp)
+                if kwargs.get('stream') and resp is not None:
+                    # The body is still on the wire; read_stream settles once it has been consumed
+                    resp.settle = settle
+                else:
+                    settle(response_size(resp))
+            self._record_success()
+
+            retry_after = parse_retry_after(resp) if resp.status_code in [429, 503] else None
+            if retry_after is not None:
+                self.throttle.pause(retry_after)
+
+            if resp.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                return resp
+            if probe and not is_rate_limited(resp):
+                return resp
+            if retry_after is not None:
+                delay = retry_after
+            else:
+                delay = self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            if time.monotonic() + delay >= self.deadline:
+                return resp
+            if kwargs.get('stream'):
+                resp.close()
+                resp.settle(0)
+            time.sleep(delay)
+
+    def _settler(self, url, started, healthy, probe, resp):
+        """Returns a one-shot callback that frees the throttle slot and records the request's metrics."""
+        settled = []
+
+        def settle(size):
+            if settled:
+                return
+            settled.append(True)
+            elapsed = time.monotonic() - started
+            self.throttle.release(elapsed, healthy, adapt=not probe or is_rate_limited(resp))
+            METRICS.record_request(self.name, url, elapsed, size, resp.status_code if resp is not None else None)
+        return settle
+
+    @contextmanager
+    def read_stream(self, resp, chunk_size=65536):
+        """Yields the body chunks of a stream=True response.
+
+        On exit the connection is closed and the request is settled with the full transfer time and
+        the bytes actually read. Reading past the instance's time budget raises InstanceUnreachable.
+        """
+        read = [0]
+
+        def chunks():
+            for chunk in resp.iter_content(chunk_size=chunk_size):
+                if time.monotonic() >= self.deadline:
+                    raise InstanceUnreachable(f"{self.name}: time budget exhausted while reading {resp.url}")
+                read[0] += len(chunk)
+                yield chunk
+        try:
+            yield chunks()
+        finally:
+            resp.close()
+            settle = getattr(resp, 'settle', None)
+            if settle:
+                settle(read[0])
+
+    def url(self, path):
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}{path}"
+
+    def get(self, path, timeout=10, cache=False, probe=False, **kwargs):
+        """GETs a path or absolute URL. With cache=True the response is shared for the rest of the run.
+
+        With probe=True the request is never retried and its connection failures do not trip
+        the instance's circuit breaker.
+        """
+        url = self.url(path)
+        if cache:
+            return RESPONSE_CACHE.fetch((self.name, url), lambda: self._send(url, timeout, probe, **kwargs))
+        return self._send(url, timeout, probe, **kwargs)
+
+    def _send(self, url, timeout, probe=False, **kwargs):
+        if API_ARCHIVE.replaying:
+            return API_ARCHIVE.replay(self, url, probe)
+        try:
+            resp = self._request(url, timeout, probe, **kwargs)
+        except requests.exceptions.RequestException as e:
+            API_ARCHIVE.record_error(self.name, url, e)
+            raise
+        API_ARCHIVE.record(self.name, url, resp)
+        return resp
+
+    def iter_pages(self, path, page_size=1000, timeout=15, trim=None):
+        """Yields each page (a list of items) of a Rancher collection, following `pagination.next`.
+
+        With `trim`, pages are parsed straight off the socket and each item is cut down to the
+        fields the audit reads before the next one is decoded.
+        """
+        separator = '&' if '?' in path else '?'
+        next_url = f"{path}{separator}limit={page_size}"
+        while next_url:
+            if trim and self.stream_listings:
+                resp = self.get(next_url, timeout=timeout, stream=True)
+                with self.read_stream(resp) as chunks:
+                    resp.raise_for_status()
+                    items, pagination = parse_collection_stream(chunks, trim)
+            else:
+                resp = self.get(next_url, timeout=timeout)
+                resp.raise_for_status()
+                payload = resp.json()
+                items = payload.get('data', [])
+                items = [trim(item) for item in items] if trim else items
+                pagination = payload.get('pagination')
+            yield items
+            next_url = (pagination or {}).get('next')
+
+    def iter_collection(self, path, page_size=1000, timeout=15, trim=None):
+        """Yields every item of a Rancher collection, one page at a time."""
+        for page in self.iter_pages(path, page_size, timeout, trim):
+            for item in page:
+                yield item
+
+    def close(self):
+        self.session.close()
+
+def get_client(instance, pool_size=DEFAULT_SETTINGS["http_pool_size"]):
+    key = (instance['url'].rstrip('/'), instance['token'])
+    with _CLIENTS_LOCK:
+        if key not in _CLIENTS:
+            _CLIENTS[key] = RancherClient(instance, pool_size)
+        return _CLIENTS[key]
+
+def close_clients():
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            client.close()
+        _CLIENTS.clear()
+
+# ==========================================
+# INCREMENTAL AUDIT SNAPSHOT
+# ==========================================
+
+class AuditSnapshot:
+    """The previous run's clusters, keyed by instance and cluster id.
+
+    Each entry keeps the cluster's content fingerprint, its enrichment (node region/arch and
+    Harvester version) and the record that was reported. Clusters whose fingerprint is unchanged
+    reuse the stored enrichment until it is `max_age_hours` old. Comparing the records gives the
+    "what changed since the last audit" diff.
+    """
+
+    def __init__(self, path, max_age_hours=24, previous=None):
+        self.path = path
+        self.max_age = float(max_age_hours) * 3600
+        self.previous = previous or {}
+        self.current = {}
+        self.complete_instances = set()
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, max_age_hours=24):
+        previous = {}
+        try:
+            with open(path, 'r') as f:
+                previous = json.load(f).get('clusters', {})
+        except (OSError, ValueError):
+            pass
+        return cls(path, max_age_hours, previous)
+
+    @staticmethod
+    def key(instance_name, cluster_id):
+        return f"{instance_name}/{cluster_id}"
+
+    def lookup(self, instance_name, cluster_id, fingerprint):
+        """Returns (node_meta, hv_version, True) from the last run if the cluster is unchanged, else None."""
+        entry = self.previous.get(self.key(instance_name, cluster_id))
+        if not entry or entry.get('fingerprint') != fingerprint:
+            return None
+        if time.time() - entry.get('enriched_at', 0) > self.max_age or entry.get('hv_version') in ["Unknown", "Unreachable"]:
+            return None
+        with self._lock:
+            self.reused += 1
+        return entry['node_meta'], entry.get('hv_version'), True
+
+    def update(self, instance_name, cluster_id, fingerprint, node_meta, hv_version, kind, record, reused, complete=True):
+        key = self.key(instance_name, cluster_id)
+        # Enrichment from a failed node lookup is kept for the change report but stored as
+        # already stale, so the next run looks the cluster up again instead of reusing defaults
+        enriched_at = self.previous[key]['enriched_at'] if reused else time.time() if complete else 0
+        with self._lock:
+            self.current[key] = {
+                'fingerprint': fingerprint,
+                'enriched_at': enriched_at,
+                'node_meta': node_meta,
+                'hv_version': hv_version,
+                'kind': kind,
+                'record': record,
+            }
+
+    def mark_complete(self, instance_name):
+        """The instance's full cluster listing succeeded, so clusters missing from it were removed."""
+        with self._lock:
+            self.complete_instances.add(instance_name)
+
+    def _instance_of(self, key):
+        return key.rsplit('/', 1)[0]
+
+    def _current_entries(self):
+        # Records are serialised late so they include the region status resolved by Inventory
+        return {key: dict(entry, record=entry['record'].as_dict()) for key, entry in self.current.items()}
+
+    def changes(self):
+        """Returns (added, removed, changed) records; changed items are (record, {field: (old, new)})."""
+        added, removed, changed = [], [], []
+        current = self._current_entries()
+        for key, entry in current.items():
+            old = self.previous.get(key)
+            if old is None:
+                added.append(entry['record'])
+                continue
+            diff = {field: (old['record'].get(field), value) for field, value in entry['record'].items()
+                    if old['record'].get(field) != value}
+            if diff:
+                changed.append((entry['record'], diff))
+        for key, entry in self.previous.items():
+            if key not in current and self._instance_of(key) in self.complete_instances:
+                removed.append(entry['record'])
+        return added, removed, changed
+
+    def report_changes(self):
+        if not self.previous:
+            return
+        added, removed, changed = self.changes()
+        print(f"\n🔁 Changes since last audit: {len(added)} new, {len(removed)} removed, {len(changed)} changed "
+              f"({self.reused} unchanged clusters reused their enrichment)")
+        for record in added:
+            print(f"    + [{record['server']}] {record['name']}")
+        for record in removed:
+            print(f"    - [{record['server']}] {record['name']}")
+        for record, diff in changed:
+            fields = ", ".join(f"{field} {old} → {new}" for field, (old, new) in diff.items())
+            print(f"    ~ [{record['server']}] {record['name']}: {fields}")
+
+    def save(self):
+        # Instances that were filtered, failed or not scanned keep their previous entries
+        clusters = {key: entry for key, entry in self.previous.items()
+                    if self._instance_of(key) not in self.complete_instances}
+        clusters.update(self._current_entries())
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'generated': datetime.now().isoformat(), 'clusters': clusters}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Warning: Could not write audit snapshot {self.path}: {e}")
+
+class HarvesterVersionCache:
+    """Harvester versions by instance and cluster id, kept across runs for `ttl_hours`.
+
+    Only versions that were actually read are stored, so Unknown and Unreachable clusters are
+    probed again next time. With `refresh` every cluster is re-probed and the results stored.
+    """
+
+    def __init__(self, path, ttl_hours=24, entries=None, refresh=False):
+        self.path = path
+        self.ttl = float(ttl_hours) * 3600
+        self.entries = entries or {}
+        self.refresh = refresh
+        self.reused = 0
+        self.probed = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, ttl_hours=24, refresh=False):
+        entries = {}
+        try:
+            with open(path, 'r') as f:
+                entries = json.load(f).get('versions', {})
+        except (OSError, ValueError):
+            pass
+        return cls(path, ttl_hours, entries, refresh)
+
+    def _fresh(self, entry):
+        return time.time() - entry.get('checked_at', 0) < self.ttl
+
+    def lookup(self, instance_name, cluster_id):
+        if self.refresh:
+            return None
+        entry = self.entries.get(AuditSnapshot.key(instance_name, cluster_id))
+        if not entry or not self._fresh(entry):
+            return None
+        with self._lock:
+            self.reused += 1
+        return entry['version']
+
+    def store(self, instance_name, cluster_id, version):
+        key = AuditSnapshot.key(instance_name, cluster_id)
+        with self._lock:
+            self.probed += 1
+            if version in ["Unknown", "Unreachable"]:
+                self.entries.pop(key, None)
+            else:
+                self.entries[key] = {'version': version, 'checked_at': time.time()}
+
+    def mark_skipped(self):
+        with self._lock:
+            self.skipped += 1
+
+    def report(self):
+        if self.reused or self.probed or self.skipped:
+            print(f"🚜 Harvester versions: {self.reused} cached, {self.probed} probed, "
+                  f"{self.skipped} skipped as disconnected")
+
+    def save(self):
+        with self._lock:
+            versions = {key: entry for key, entry in self.entries.items() if self._fresh(entry)}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'generated': datetime.now().isoformat(), 'versions': versions}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Warning: Could not write Harvester version cache {self.path}: {e}")
 
 # ==========================================
 # STANDARD AUDIT FUNCTIONS
 # ==========================================
 
-def get_server_summary(instance):
-    headers = {"Authorization": f"Bearer {instance['token']}"}
-    base_url = instance['url'].rstrip('/')
+def get_server_summary(instance, node_index=None):
+    client = get_client(instance)
     clean_url = instance['url'].replace("https://", "").replace("http://", "").rstrip('/')
     
-    summary = {
-        "Name": instance['name'],
-        "URL": clean_url,
-        "Rancher Version": "Unknown",
-        "Rancher Status": "Unknown",
-        "Local K8s Version": "Unknown",
-        "K8s Status": "Unknown",
-        "AWS Region": "N/A",
-        "Backup Operator": "Not Found",
-        "Config Comment": instance.get('comment', "")
-    }
+    summary = ServerRecord(
+        name=instance['name'],
+        url=clean_url,
+        rancher_version="Unknown",
+        rancher_status="Unknown",
+        k8s_version="Unknown",
+        k8s_status="Unknown",
+        aws_region="N/A",
+        backup_operator="Not Found",
+        comment=instance.get('comment', "")
+    )
 
     try:
-        v_resp = requests.get(f"{base_url}/v3/settings/server-version", headers=headers, verify=False, timeout=10)
+        v_resp = client.get("/v3/settings/server-version", cache=True)
         if v_resp.status_code == 200:
-            summary["Rancher Version"] = v_resp.json().get('value', 'Unknown')
-            summary["Rancher Status"] = get_rancher_version_status(summary["Rancher Version"], summary["Name"])
+            summary.rancher_version = v_resp.json().get('value', 'Unknown')
+            summary.rancher_status = get_rancher_version_status(summary.rancher_version, summary.name)
 
-        c_resp = requests.get(f"{base_url}/v3/clusters/local", headers=headers, verify=False, timeout=10)
+        c_resp = client.get("/v3/clusters/local", cache=True)
         if c_resp.status_code == 200:
             c_data = c_resp.json()
-            summary["Local K8s Version"] = c_data.get('version', {}).get('gitVersion', 'N/A')
-            summary["K8s Status"] = get_k8s_version_status(summary["Local K8s Version"], f"[{summary['Name']}] Local Server")
+            summary.k8s_version = c_data.get('version', {}).get('gitVersion', 'N/A')
+            summary.k8s_status = get_k8s_version_status(summary.k8s_version, "Local Server", summary.name)
             
             region = ""
             for key in ['amazonElasticContainerServiceConfig', 'eksConfig']:
@@ -223,162 +1542,347 @@ def get_server_summary(instance):
                     region = c_data[key].get('region', '')
             
             if not region:
-                node_meta = get_node_metadata(base_url, 'local', headers)
+                if node_index and 'local' in node_index:
+                    node_meta = node_index['local']
+                else:
+                    node_meta = get_node_metadata(client, 'local') or {}
                 region = node_meta.get("region", "")
                 
-            summary["AWS Region"] = region if region else "N/A"
+            summary.aws_region = region if region else "N/A"
 
-        crd_resp = requests.get(f"{base_url}/v1/apiextensions.k8s.io.customresourcedefinitions/backups.resources.cattle.io", headers=headers, verify=False, timeout=10)
+        crd_resp = client.get("/v1/apiextensions.k8s.io.customresourcedefinitions/backups.resources.cattle.io", cache=True)
         if crd_resp.status_code == 200:
-            summary["Backup Operator"] = "Installed"
+            summary.backup_operator = "Installed"
 
     except Exception as e:
-        print(f"⚠️ Error summarising {instance['name']}: {e}")
+        log_line(f"⚠️ Error summarising server: {e}", instance["name"])
     
     return summary
 
-def get_node_metadata(base_url, cluster_id, headers):
+def extract_node_metadata(node):
+    labels = node.get('labels', {})
+    if not labels:
+        labels = node.get('info', {}).get('kubernetes', {}).get('labels', {})
+    
+    return {
+        "region": (
+            labels.get('topology.kubernetes.io/region') or 
+            labels.get('failure-domain.beta.kubernetes.io/region') or 
+            ""
+        ),
+        "arch": (
+            labels.get('kubernetes.io/arch') or 
+            labels.get('beta.kubernetes.io/arch') or 
+            "Unknown"
+        )
+    }
+
+NODE_LABELS = ['topology.kubernetes.io/region', 'failure-domain.beta.kubernetes.io/region',
+               'kubernetes.io/arch', 'beta.kubernetes.io/arch']
+
+def trim_node(node):
+    """Keeps a node's cluster id and the labels extract_node_metadata reads."""
+    labels = node.get('labels') or {}
+    info_labels = ((node.get('info') or {}).get('kubernetes') or {}).get('labels') or {}
+    trimmed = {'id': node.get('id'), 'clusterId': node.get('clusterId'),
+               'labels': {k: labels[k] for k in NODE_LABELS if k in labels}}
+    if not labels and info_labels:
+        trimmed['info'] = {'kubernetes': {'labels': {k: info_labels[k] for k in NODE_LABELS if k in info_labels}}}
+    return trimmed
+
+def get_node_metadata(client, cluster_id):
+    """Returns the first node's region/arch, the defaults for a cluster without nodes, or None if the lookup failed."""
     metadata = {"region": "", "arch": "Unknown"}
     try:
-        node_url = f"{base_url}/v3/clusters/{cluster_id}/nodes?limit=1"
-        resp = requests.get(node_url, headers=headers, verify=False, timeout=10)
+        resp = client.get(f"/v3/clusters/{cluster_id}/nodes?limit=1", cache=True)
         
-        if resp.status_code == 200:
-            nodes = resp.json().get('data', [])
-            if nodes:
-                node = nodes[0]
-                labels = node.get('labels', {})
-                if not labels:
-                    labels = node.get('info', {}).get('kubernetes', {}).get('labels', {})
-                
-                metadata["region"] = (
-                    labels.get('topology.kubernetes.io/region') or 
-                    labels.get('failure-domain.beta.kubernetes.io/region') or 
-                    ""
-                )
-                metadata["arch"] = (
-                    labels.get('kubernetes.io/arch') or 
-                    labels.get('beta.kubernetes.io/arch') or 
-                    "Unknown"
-                )
+        if resp.status_code != 200:
+            return None
+        nodes = resp.json().get('data', [])
+        if nodes:
+            metadata = extract_node_metadata(nodes[0])
     except Exception:
-        pass
+        return None
     return metadata
 
-def get_harvester_version(base_url, cluster_id, headers):
+def get_node_index(client, page_size=1000):
+    """Lists /v3/nodes once and maps each clusterId to its first node's metadata.
+
+    Returns None when the bulk listing fails, so callers can fall back to per-cluster lookups.
+    """
+    index = {}
     try:
-        url = f"{base_url}/k8s/clusters/{cluster_id}/apis/harvesterhci.io/v1beta1/settings/server-version"
-        resp = requests.get(url, headers=headers, verify=False, timeout=30)
-        if resp.status_code == 200:
+        for node in client.iter_collection("/v3/nodes", page_size, trim=trim_node):
+            cluster_id = node.get('clusterId')
+            if cluster_id and cluster_id not in index:
+                index[cluster_id] = extract_node_metadata(node)
+    except Exception as e:
+        log_line(f"⚠️ Bulk node listing failed, falling back to per-cluster lookups: {e}", client.name)
+        return None
+    return index
+
+def get_harvester_version(client, cluster_id, timeout=5):
+    """Reads the Harvester version through Rancher's cluster proxy.
+
+    Returns "Unreachable" when the proxied cluster does not answer (connection failure, timeout
+    or a 502/503/504 from the proxy) and "Unknown" when it answers without a usable version, or
+    when Rancher was still rate limiting after the retries.
+    """
+    url = f"/k8s/clusters/{cluster_id}/apis/harvesterhci.io/v1beta1/settings/server-version"
+    try:
+        resp = client.get(url, timeout=timeout, cache=True, probe=True)
+    except requests.exceptions.RequestException:
+        return "Unreachable"
+    if is_rate_limited(resp):
+        return "Unknown"
+    if resp.status_code in [502, 503, 504]:
+        return "Unreachable"
+    if resp.status_code == 200:
+        try:
             data = resp.json()
+        except ValueError:
+            return "Unknown"
+        if isinstance(data, dict):
             return data.get('value') or data.get('default') or "Unknown"
-    except Exception as e:
-        pass
     return "Unknown"
 
-def get_cluster_data(instances):
+def enrich_cluster(client, cluster_id, provider_type, node_index=None, connected=True,
+                   harvester_versions=None, probe_timeout=5):
+    """Runs the blocking per-cluster lookups (node labels, Harvester version) for one cluster.
+
+    Returns (node_meta, hv_version, complete); complete is False when the node lookup failed
+    and node_meta holds defaults.
+    """
+    with METRICS.phase("enrichment"):
+        node_meta = {"region": "", "arch": "Unknown"}
+        complete = True
+        hv_version = None
+        if cluster_id and node_index is not None:
+            node_meta = node_index.get(cluster_id, node_meta)
+        elif cluster_id:
+            fetched = get_node_metadata(client, cluster_id)
+            complete = fetched is not None
+            node_meta = fetched or node_meta
+        if provider_type == 'Harvester':
+            if not connected:
+                # The listing already says the agent is gone; a probe would only wait out its timeout
+                hv_version = "Unreachable"
+                if harvester_versions:
+                    harvester_versions.mark_skipped()
+            else:
+                hv_version = harvester_versions.lookup(client.name, cluster_id) if harvester_versions else None
+            if hv_version is None:
+                hv_version = get_harvester_version(client, cluster_id, probe_timeout)
+                if harvester_versions:
+                    harvester_versions.store(client.name, cluster_id, hv_version)
+        return node_meta, hv_version, complete
+
+def iter_cluster_pages(client, page_size=1000, cluster_filter=None):
+    """Streams /v3/clusters page by page so large fleets are never truncated or held whole in memory.
+
+    With a cluster filter that Rancher can evaluate, only the matching listings are requested.
+    """
+    queries = cluster_filter.query_filters() if cluster_filter else [""]
+    seen = set()
+    for query in queries:
+        pages = client.iter_pages(f"/v3/clusters?{query}" if query else "/v3/clusters", page_size, trim=trim_cluster)
+        while True:
+            with METRICS.phase("listing"):
+                page = next(pages, None)
+            if page is None:
+                break
+            if len(queries) > 1:
+                # Overlapping filters (e.g. 'prod' and 'prod*') must not list a cluster twice
+                page = [c for c in page if c.get('id') not in seen]
+                seen.update(c.get('id') for c in page)
+            yield page
+
+def build_cluster_record(instance, row, node_meta, hv_version):
+    region = row.config_region or node_meta["region"]
+    arch = node_meta["arch"]
+    log_k8s_status(row.name, row.git_version, row.k8s_status, row.k8s_detail, instance["name"])
+
+    if row.provider_type == 'Harvester':
+        return HarvesterRecord(
+            server=instance['name'],
+            name=row.name,
+            harvester_version=hv_version,
+            harvester_status=get_harvester_version_status(hv_version, row.name),
+            k8s_version=row.git_version,
+            k8s_status=row.k8s_status,
+            cpu_arch=arch,
+            comments=""
+        )
+
+    return ClusterRecord(
+        server=instance['name'],
+        name=row.name,
+        provider_type=row.provider_type,
+        k8s_distribution=row.k8s_distribution,
+        k8s_version=row.git_version,
+        k8s_status=row.k8s_status,
+        cpu_arch=arch,
+        region=region if region else "N/A",
+        region_status="Unknown",
+        cpu_cores=_optional_number(row.cpu_cores),
+        memory_gib=_optional_number(row.memory_gib),
+        pods=_optional_number(row.pods, int),
+        comments=""
+    )
+
+def wants_node_sweep(settings, cluster_filter=None):
+    return settings["bulk_node_lookup"] and not (cluster_filter and cluster_filter.pushed_down)
+
+def get_cluster_data(instances, settings=DEFAULT_SETTINGS, on_record=None, cluster_filter=None, snapshot=None,
+                     harvester_versions=None, prefetched_nodes=None, node_sweep=True):
+    """Lists, classifies and enriches each instance's clusters.
+
+    `prefetched_nodes` is a node index already built for a single instance; with node_sweep=False
+    no further /v3/nodes sweep is attempted (e.g. because the prefetch already failed).
+    """
     downstream_clusters = []
     harvester_clusters = []
     
     for instance in instances:
-        print(f"\n🚀 Scanning Rancher Instance: {instance['name']}...")
-        headers = {"Authorization": f"Bearer {instance['token']}"}
-        base_url = instance['url'].rstrip('/')
-        api_url = f"{base_url}/v3/clusters"
+        log_line("\n🚀 Scanning Rancher Instance...", instance["name"])
+        client = get_client(instance)
 
-        try:
-            response = requests.get(api_url, headers=headers, verify=False, timeout=15)
-            response.raise_for_status()
-            for cluster in response.json().get('data', []):
-
-                cluster_id = cluster.get('id', '')
-                git_version = cluster.get('version', {}).get('gitVersion', 'N/A')
-                raw_driver = cluster.get('driver', '').lower()
-                raw_provider = cluster.get('provider', '').lower()
-
-                if cluster_id == 'local':
-                    provider_type = 'Local'
-                elif 'import' in raw_driver or 'import' in raw_provider:
-                    provider_type = 'Imported'
-                elif 'harvester' in raw_driver or 'harvester' in raw_provider:
-                    provider_type = 'Harvester'
-                else:
-                    cloud_identifiers = ['eks', 'gke', 'aks', 'amazonec2', 'vsphere', 'azure', 'digitalocean', 'linode', 'amazonelasticcontainerservice']
-                    is_virtual = any(cloud_id in raw_driver for cloud_id in cloud_identifiers)
-                    if not is_virtual:
-                        for key in cluster.keys():
-                            if key.lower().endswith('config') and any(cloud_id in key.lower() for cloud_id in cloud_identifiers):
-                                is_virtual = True
-                                break
-                    provider_type = 'Virtual' if is_virtual else 'Custom'
-
-                region = ""
-                arch = "Unknown"
-                for key in ['amazonElasticContainerServiceConfig', 'eksConfig']:
-                    if cluster.get(key):
-                        region = cluster[key].get('region', '')
-                
-                if cluster_id:
-                    node_meta = get_node_metadata(base_url, cluster_id, headers)
-                    arch = node_meta["arch"]
-                    if not region:
-                        region = node_meta["region"]
-
-                c_name = cluster.get('name', 'Unknown')
-
-                if provider_type == 'Harvester':
-                    hv_version = get_harvester_version(base_url, cluster_id, headers)
-                    
-                    hv_status = get_harvester_version_status(hv_version, c_name)
-                    k8s_status = get_k8s_version_status(git_version, c_name)
-                    
-                    harvester_clusters.append({
-                        "Cluster Name": c_name,
-                        "Harvester Version": hv_version,
-                        "Harvester Status": hv_status,
-                        "Kubernetes Version": git_version,
-                        "K8s Status": k8s_status,
-                        "CPU Arch": arch,
-                        "Rancher Server": instance['name'],
-                        "Comments": ""
-                    })
-                else:
-                    if '+rke2' in git_version: k8s_dist = 'RKE2'
-                    elif '+k3s' in git_version: k8s_dist = 'K3s'
-                    elif '-eks' in git_version or raw_driver in ['amazonelasticcontainerservice', 'eks']: k8s_dist = 'AWS EKS'
-                    elif 'rancherkubernetesengine' in raw_driver: k8s_dist = 'RKE1'
-                    else: k8s_dist = 'Upstream/Other'
-
-                    allocatable = cluster.get('allocatable', {})
-                    cpu_cores = parse_cpu(allocatable.get('cpu', '0'))
-                    memory_gib = parse_memory(allocatable.get('memory', '0'))
-                    pods = allocatable.get('pods', '0')
-
-                    k8s_status = get_k8s_version_status(git_version, c_name)
-
-                    downstream_clusters.append({
-                        "Rancher Server": instance['name'],
-                        "Cluster Name": c_name,
-                        "Provider Type": provider_type,
-                        "K8s Distribution": k8s_dist,
-                        "Full K8s Version": git_version,
-                        "K8s Status": k8s_status,
-                        "CPU Arch": arch,
-                        "Region": region if region else "N/A",
-                        "CPU (Cores)": cpu_cores,
-                        "Memory": memory_gib,
-                        "Total Pods": pods,
-                        "Comments": ""
-                    })
+        # One paginated /v3/nodes sweep replaces a nodes call per cluster, unless a pushed-down name
+        # filter lists only a few clusters that are cheaper to look up one by one. The sweep is
+        # deferred until a cluster actually needs enriching, so a fully unchanged fleet skips it.
+        node_index = prefetched_nodes if len(instances) == 1 else None
+        needs_node_index = node_index is None and node_sweep and wants_node_sweep(settings, cluster_filter)
 
-        except Exception as e:
-            print(f"⚠️ Error fetching clusters from {instance['name']}: {e}")
+        def emit(row, future, reused):
+            node_meta, hv_version, complete = future.result()
+            record = build_cluster_record(instance, row, node_meta, hv_version)
+            kind = "harvester" if row.provider_type == 'Harvester' else "downstream"
+            if kind == "harvester":
+                harvester_clusters.append(record)
+            else:
+                downstream_clusters.append(record)
+            if snapshot:
+                snapshot.update(instance['name'], row.id, row.fingerprint, node_meta, hv_version, kind, record, reused,
+                                complete)
+            if on_record:
+                on_record(kind, record)
+
+        # Each page is classified as one columnar batch, then its clusters are enriched on a
+        # per-instance capped pool. Records are emitted from the head of the queue, so output
+        # keeps the listing order.
+        pending = deque()
+        workers = max(1, int(settings["max_parallel_clusters"] or 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                for page in iter_cluster_pages(client, settings["page_size"], cluster_filter):
+                    # An empty page (e.g. a pushed-down name this instance doesn't have) has no
+                    # typed columns to classify
+                    if not page:
+                        continue
+                    with METRICS.phase("classification"):
+                        table = classify_clusters(load_cluster_table(page))
+                    if cluster_filter:
+                        table = cluster_filter.apply(table)
+                    for row in table.itertuples(index=False):
+                        # Connectivity is not part of the fingerprint, so a Harvester cluster that has
+                        # since disconnected must not be reported with its old version
+                        reusable = snapshot and (row.connected or row.provider_type != 'Harvester')
+                        cached = snapshot.lookup(instance['name'], row.id, row.fingerprint) if reusable else None
+                        if cached:
+                            future = Future()
+                            future.set_result(cached)
+                        else:
+                            if needs_node_index:
+                                with METRICS.phase("node index"):
+                                    node_index = get_node_index(client, settings["page_size"])
+                                needs_node_index = False
+                            future = pool.submit(enrich_cluster, client, row.id, row.provider_type, node_index, row.connected,
+                                                 harvester_versions, settings["harvester_probe_timeout_seconds"])
+                        pending.append((row, future, cached is not None))
+                    while pending and pending[0][1].done():
+                        emit(*pending.popleft())
+                if snapshot and not cluster_filter:
+                    snapshot.mark_complete(instance['name'])
+            except Exception as e:
+                log_line(f"⚠️ Error fetching clusters: {e}", instance["name"])
+
+            while pending:
+                emit(*pending.popleft())
             
     return downstream_clusters, harvester_clusters
 
-def save_styled_excel(server_summaries, downstream_clusters, harvester_clusters, filename="rancher_inventory.xlsx"):
-    writer = pd.ExcelWriter(filename, engine='xlsxwriter')
-    workbook = writer.book
+def mark_unreachable(client, summary):
+    # Nothing came back and the instance is unreachable: say so rather than reporting "Unknown"
+    if client.unreachable and summary.rancher_version == "Unknown":
+        if client.connection_failed and not client.had_success and not client.circuit_open:
+            log_line("⛔ could not connect and nothing answered this scan, marking it Unreachable", summary.name)
+        for field in ["rancher_version", "rancher_status", "k8s_version", "k8s_status"]:
+            setattr(summary, field, "Unreachable")
+    return summary
+
+def summarise_instance(instance, settings=DEFAULT_SETTINGS):
+    """Server summary only: a handful of requests, no cluster listing."""
+    client = get_client(instance, settings["http_pool_size"])
+    client.start_scan(settings)
+    with METRICS.phase("summary"):
+        return mark_unreachable(client, get_server_summary(instance))
+
+def scan_instance(instance, settings=DEFAULT_SETTINGS, on_record=None, cluster_filter=None, snapshot=None,
+                  harvester_versions=None):
+    # Register the pooled client first so the summary and cluster scan share its connections
+    client = get_client(instance, max(settings["http_pool_size"], settings["max_parallel_clusters"]))
+    client.start_scan(settings)
+
+    # Without a snapshot the /v3/nodes sweep is certain to run, so it runs first and the summary
+    # takes the local cluster's region from it instead of listing local's nodes separately
+    node_index = None
+    prefetch = snapshot is None and wants_node_sweep(settings, cluster_filter)
+    if prefetch:
+        with METRICS.phase("node index"):
+            node_index = get_node_index(client, settings["page_size"])
+    with METRICS.phase("summary"):
+        summary = get_server_summary(instance, node_index)
+
+    def emit(kind, record):
+        # The parent region is already known, so streamed records carry their final region status
+        if kind == "downstream":
+            record.region_status = get_region_status(record.region, summary.aws_region)
+        on_record(kind, record)
+
+    downstream, harvester = get_cluster_data([instance], settings, emit if on_record else None, cluster_filter, snapshot,
+                                             harvester_versions, node_index, node_sweep=not prefetch)
+
+    mark_unreachable(client, summary)
+    if on_record:
+        on_record("server", summary)
+    return summary, downstream, harvester
+
+def run_audit(instances, settings=DEFAULT_SETTINGS, on_record=None, cluster_filter=None, snapshot=None,
+              harvester_versions=None):
+    """Scans every instance on a bounded worker pool and merges the results back in config order.
+
+    `on_record(kind, record)` is called from the worker threads as each record is finished.
+    """
+    workers = max(1, min(int(settings["max_parallel_instances"] or 1), len(instances) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda i: scan_instance(i, settings, on_record, cluster_filter, snapshot,
+                                                        harvester_versions), instances))
+
+    server_summaries, downstream_clusters, harvester_clusters = [], [], []
+    for summary, downstream, harvester in results:
+        server_summaries.append(summary)
+        downstream_clusters.extend(downstream)
+        harvester_clusters.extend(harvester)
+    return Inventory(server_summaries, downstream_clusters, harvester_clusters)
+
+def save_styled_excel(inventory, filename="rancher_inventory.xlsx", constant_memory=True):
+    """Writes the inventory workbook top to bottom in a single pass.
+
+    Rows are emitted strictly in order, so xlsxwriter's constant_memory mode can flush each row
+    to disk as soon as the next one starts and RAM stays flat however large the fleet is.
+    """
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(filename, {'constant_memory': constant_memory})
     worksheet = workbook.add_worksheet("Rancher Inventory")
 
     title_fmt = workbook.add_format({'bold': True, 'font_size': 12, 'bg_color': '#D7E4BC', 'border': 1})
@@ -395,234 +1899,971 @@ def save_styled_excel(server_summaries, downstream_clusters, harvester_clusters,
         "Green": workbook.add_format({'border': 1, 'align': 'center', 'bg_color': '#C6EFCE', 'font_color': '#006100'}),
         "Yellow": workbook.add_format({'border': 1, 'align': 'center', 'bg_color': '#FFEB9C', 'font_color': '#9C5700'}),
         "Red": workbook.add_format({'border': 1, 'align': 'center', 'bg_color': '#FFC7CE', 'font_color': '#9C0006'}),
-        "Unknown": data_center_fmt
+        "Unknown": data_center_fmt,
+        "Unreachable": workbook.add_format({'border': 1, 'align': 'center', 'bg_color': '#D9D9D9', 'font_color': '#404040', 'italic': True})
     }
 
+    worksheet.set_column(0, 0, 25) 
+    worksheet.set_column(1, 2, 28) 
+    worksheet.set_column(3, 3, 25) 
+    worksheet.set_column(4, 4, 15) 
+    worksheet.set_column(5, 5, 15) 
+    worksheet.set_column(6, 8, 12) 
+    worksheet.set_column(9, 9, 20) 
+
     worksheet.write(0, 0, "MANAGEMENT SERVER SUMMARY", title_fmt)
     sum_headers = ["Name", "URL", "Rancher Version", "Local K8s Version", "AWS Region", "Backup Operator", "Config Comment"]
-    for col, h in enumerate(sum_headers):
-        worksheet.write(1, col, h, header_fmt)
+    worksheet.write_row(1, 0, sum_headers, header_fmt)
     
     curr_row = 2
-    for s in server_summaries:
-        for col, key in enumerate(sum_headers):
-            if key == "Local K8s Version":
-                worksheet.write(curr_row, col, s[key], status_fmt.get(s["K8s Status"], data_center_fmt))
-            elif key == "Rancher Version":
-                worksheet.write(curr_row, col, s[key], status_fmt.get(s["Rancher Status"], data_center_fmt))
-            else:
-                worksheet.write(curr_row, col, s[key], data_fmt)
+    for s in inventory.servers:
+        worksheet.write_row(curr_row, 0, [s.name, s.url], data_fmt)
+        worksheet.write(curr_row, 2, s.rancher_version, status_fmt.get(s.rancher_status, data_center_fmt))
+        worksheet.write(curr_row, 3, s.k8s_version, status_fmt.get(s.k8s_status, data_center_fmt))
+        worksheet.write_row(curr_row, 4, [s.aws_region, s.backup_operator, s.comment], data_fmt)
         curr_row += 1
 
     curr_row += 2 
 
-    if harvester_clusters:
+    if inventory.harvester:
         worksheet.write(curr_row, 0, "HARVESTER CLUSTERS", harvester_title_fmt)
         curr_row += 1
         
         harvester_headers = ["Cluster Name", "Harvester Version", "Kubernetes Version", "CPU Arch", "Rancher Server", "Comments"]
-        for col, h in enumerate(harvester_headers):
-            worksheet.write(curr_row, col, h, harvester_header_fmt)
-        
+        worksheet.write_row(curr_row, 0, harvester_headers, harvester_header_fmt)
         curr_row += 1
-        df_harvester = pd.DataFrame(harvester_clusters)
         
-        for server in df_harvester['Rancher Server'].unique():
+        for server, rows in group_by_server(inventory.harvester).items():
             worksheet.merge_range(curr_row, 0, curr_row, len(harvester_headers)-1, f"Environment: {server}", harvester_section_fmt)
             curr_row += 1
-            subset = df_harvester[df_harvester['Rancher Server'] == server]
-            for _, r in subset.iterrows():
-                worksheet.write(curr_row, 0, r['Cluster Name'], data_fmt)
-                worksheet.write(curr_row, 1, r['Harvester Version'], status_fmt.get(r['Harvester Status'], data_center_fmt))
-                worksheet.write(curr_row, 2, r['Kubernetes Version'], status_fmt.get(r['K8s Status'], data_center_fmt))
-                worksheet.write(curr_row, 3, r['CPU Arch'], data_center_fmt)
-                worksheet.write(curr_row, 4, r['Rancher Server'], data_fmt)
-                worksheet.write(curr_row, 5, r['Comments'], data_fmt)
+            for r in rows:
+                worksheet.write(curr_row, 0, r.name, data_fmt)
+                worksheet.write(curr_row, 1, r.harvester_version, status_fmt.get(r.harvester_status, data_center_fmt))
+                worksheet.write(curr_row, 2, r.k8s_version, status_fmt.get(r.k8s_status, data_center_fmt))
+                worksheet.write(curr_row, 3, r.cpu_arch, data_center_fmt)
+                worksheet.write_row(curr_row, 4, [r.server, r.comments], data_fmt)
                 curr_row += 1
             curr_row += 1
             
         curr_row += 1
 
-    if downstream_clusters:
+    if inventory.downstream:
         worksheet.write(curr_row, 0, "MANAGED DOWNSTREAM CLUSTERS", title_fmt)
         curr_row += 1
         
         cluster_headers = [
             "Cluster Name", "Provider Type", "K8s Distribution", 
             "Full K8s Version", "CPU Arch", "Region", "CPU (Cores)", 
-            "Memory", "Total Pods", "Comments"
+            "Memory (GiB)", "Total Pods", "Comments"
         ]
-        
-        for col, h in enumerate(cluster_headers):
-            worksheet.write(curr_row, col, h, header_fmt)
-        
+        worksheet.write_row(curr_row, 0, cluster_headers, header_fmt)
         curr_row += 1
-        df_clusters = pd.DataFrame(downstream_clusters)
-        for server in df_clusters['Rancher Server'].unique():
-            
-            # Identify the parent server's region to compare against downstream clusters
-            parent_region = next((s.get("AWS Region", "N/A") for s in server_summaries if s["Name"] == server), "N/A")
-            
+
+        for server, rows in group_by_server(inventory.downstream).items():
             worksheet.merge_range(curr_row, 0, curr_row, len(cluster_headers)-1, f"Environment: {server}", section_fmt)
             curr_row += 1
-            subset = df_clusters[df_clusters['Rancher Server'] == server]
-            for _, r in subset.iterrows():
-                worksheet.write(curr_row, 0, r['Cluster Name'], data_fmt)
-                worksheet.write(curr_row, 1, r['Provider Type'], data_fmt)
-                worksheet.write(curr_row, 2, r['K8s Distribution'], data_fmt)
-                worksheet.write(curr_row, 3, r['Full K8s Version'], status_fmt.get(r['K8s Status'], data_center_fmt))
-                worksheet.write(curr_row, 4, r['CPU Arch'], data_center_fmt)
+            for r in rows:
+                worksheet.write_row(curr_row, 0, [r.name, r.provider_type, r.k8s_distribution], data_fmt)
+                worksheet.write(curr_row, 3, r.k8s_version, status_fmt.get(r.k8s_status, data_center_fmt))
+                worksheet.write(curr_row, 4, r.cpu_arch, data_center_fmt)
                 
-                # Check for Region Mismatches
-                c_reg = r['Region']
-                if c_reg in ["N/A", "Unknown", ""] or parent_region in ["N/A", "Unknown", ""]:
-                    reg_status = "Unknown"
-                elif c_reg == parent_region:
-                    reg_status = "Green"
-                else:
-                    reg_status = "Red"
-                    
-                worksheet.write(curr_row, 5, c_reg, status_fmt.get(reg_status, data_center_fmt))
+                # Region Mismatches were resolved once when the inventory was built
+                worksheet.write(curr_row, 5, r.region, status_fmt.get(r.region_status, data_center_fmt))
                 
-                worksheet.write(curr_row, 6, r['CPU (Cores)'], data_center_fmt)
-                worksheet.write(curr_row, 7, r['Memory'], data_center_fmt)
-                worksheet.write(curr_row, 8, r['Total Pods'], data_center_fmt)
-                worksheet.write(curr_row, 9, r['Comments'], data_fmt)
+                worksheet.write_row(curr_row, 6, [r.cpu_cores, r.memory_gib, r.pods], data_center_fmt)
+                worksheet.write(curr_row, 9, r.comments, data_fmt)
                 curr_row += 1
             curr_row += 1 
 
-    worksheet.set_column(0, 0, 25) 
-    worksheet.set_column(1, 2, 28) 
-    worksheet.set_column(3, 3, 25) 
-    worksheet.set_column(4, 4, 15) 
-    worksheet.set_column(5, 5, 15) 
-    worksheet.set_column(6, 8, 12) 
-    worksheet.set_column(9, 9, 20) 
-
-    writer.close()
+    workbook.close()
     print(f"✅ Spreadsheet saved: {filename}")
 
 # ==========================================
 # RICH HTML DIAGRAM GENERATOR
 # ==========================================
-def generate_mermaid_diagram(server_summaries, downstream_clusters, harvester_clusters, filename="rancher_architecture.md"):
+# Bulletproof Unicode indicator boxes
+STATUS_BOXES = {
+    "Green": "🟩",
+    "Yellow": "🟨",
+    "Red": "🟥",
+    "Unknown": "⬜",
+    "Unreachable": "⛔"
+}
+
+# Shared node styles for the scalable layout (one classDef instead of a style line per node)
+MERMAID_CLASS_DEFS = {
+    "server": "fill:#e2efda,stroke:#217346,stroke-width:2px,stroke-dasharray: 5 5,color:#000000",
+    "downstream": "fill:#ffffff,stroke:#cccccc,stroke-width:2px,stroke-dasharray: 5 5,color:#000000",
+    "harvester": "fill:#fce4d6,stroke:#c65911,stroke-width:2px,stroke-dasharray: 5 5,color:#000000",
+}
+
+def _mermaid_text(value):
+    return str(value).replace('"', "'")
+
+def _status_box(status):
+    return STATUS_BOXES.get(status, STATUS_BOXES["Unknown"])
+
+def generate_mermaid_diagram(inventory, filename="rancher_architecture.md", layout="auto", node_threshold=300, collapse_clusters=False):
+    """Writes the topology diagram, picking the classic or scalable layout.
+
+    "auto" keeps the classic single flowchart until it would exceed `node_threshold` nodes,
+    then switches to the scalable layout.
+    """
+    node_count = len(inventory.servers) + len(inventory.downstream) + len(inventory.harvester)
+    if layout == "scalable" or (layout == "auto" and (collapse_clusters or node_count > node_threshold)):
+        generate_scalable_mermaid_diagram(inventory, filename, node_threshold, collapse_clusters)
+    else:
+        generate_classic_mermaid_diagram(inventory, filename)
+
+def generate_classic_mermaid_diagram(inventory, filename="rancher_architecture.md"):
     """Generates a Markdown file using Unicode squares for unbreakable status tracking."""
-    
-    # Bulletproof Unicode indicator boxes
-    status_boxes = {
-        "Green": "🟩",
-        "Yellow": "🟨",
-        "Red": "🟥",
-        "Unknown": "⬜"
-    }
+    try:
+        with open(filename, "w") as f:
+            f.write("```mermaid\n")
+            f.write("flowchart TD\n")
+            f.write("    %% Rancher Architecture Topology\n\n")
 
-    lines = [
-        "```mermaid",
-        "flowchart TD",  
-        "    %% Rancher Architecture Topology",
-        ""
-    ]
+            server_ids = {}
 
-    server_ids = {}
+            # 1. Create Root Nodes (Rancher Servers)
+            for idx, server in enumerate(inventory.servers):
+                s_id = f"SERVER_{idx}"
+                server_ids[server.name] = s_id
+                
+                name = _mermaid_text(server.name)
+                r_ver = _mermaid_text(server.rancher_version)
+                k_ver = _mermaid_text(server.k8s_version)
+                reg = _mermaid_text(server.aws_region)
+                backup = _mermaid_text(server.backup_operator)
+                
+                r_box = _status_box(server.rancher_status)
+                k_box = _status_box(server.k8s_status)
+                
+                label = f"🏢 <b style='font-size: 2em;'>{name}</b><br><br>Rancher: 🐄 {r_ver} {r_box}<br><br>K8s: ☸️ {k_ver} {k_box}<br><br>🌍 Region: {reg}<br>💾 Backup: {backup}"
+                f.write(f'    {s_id}("{label}")\n')
+                f.write(f'    style {s_id} {MERMAID_CLASS_DEFS["server"]}\n')
 
-    # 1. Create Root Nodes (Rancher Servers)
-    for idx, server in enumerate(server_summaries):
-        s_id = f"SERVER_{idx}"
-        server_ids[server["Name"]] = s_id
-        
-        name = str(server.get("Name", "Unknown")).replace('"', "'")
-        r_ver = str(server.get("Rancher Version", "Unknown")).replace('"', "'")
-        k_ver = str(server.get("Local K8s Version", "Unknown")).replace('"', "'")
-        reg = str(server.get("AWS Region", "N/A")).replace('"', "'")
-        backup = str(server.get("Backup Operator", "Not Found")).replace('"', "'")
-        
-        r_box = status_boxes.get(server.get("Rancher Status", "Unknown"), status_boxes["Unknown"])
-        k_box = status_boxes.get(server.get("K8s Status", "Unknown"), status_boxes["Unknown"])
-        
-        label = f"🏢 <b style='font-size: 2em;'>{name}</b><br><br>Rancher: 🐄 {r_ver} {r_box}<br><br>K8s: ☸️ {k_ver} {k_box}<br><br>🌍 Region: {reg}<br>💾 Backup: {backup}"
-        lines.append(f'    {s_id}("{label}")')
-        
-        lines.append(f'    style {s_id} fill:#e2efda,stroke:#217346,stroke-width:2px,stroke-dasharray: 5 5,color:#000000')
+            f.write("\n")
 
-    lines.append("")
+            # 2. Create Downstream Cluster Nodes & Connections
+            for idx, cluster in enumerate(inventory.downstream):
+                c_id = f"DS_{idx}"
+                s_id = server_ids.get(cluster.server)
+                
+                c_name = _mermaid_text(cluster.name)
+                prov = _mermaid_text(cluster.provider_type)
+                dist = _mermaid_text(cluster.k8s_distribution)
+                k_ver = _mermaid_text(cluster.k8s_version)
+                reg = _mermaid_text(cluster.region)
+                
+                # Version Check
+                k_box = _status_box(cluster.k8s_status)
+                
+                # Region Mismatch Check (resolved once when the inventory was built)
+                reg_box = _status_box(cluster.region_status)
 
-    # 2. Create Downstream Cluster Nodes & Connections
-    for idx, cluster in enumerate(downstream_clusters):
-        c_id = f"DS_{idx}"
-        parent_name = cluster.get("Rancher Server")
-        s_id = server_ids.get(parent_name)
-        
-        # Grab parent region for compliance check
-        parent_region = next((s.get("AWS Region", "N/A") for s in server_summaries if s["Name"] == parent_name), "N/A")
-        
-        c_name = str(cluster.get("Cluster Name", "Unknown")).replace('"', "'")
-        prov = str(cluster.get("Provider Type", "Unknown")).replace('"', "'")
-        dist = str(cluster.get("K8s Distribution", "Unknown")).replace('"', "'")
-        k_ver = str(cluster.get("Full K8s Version", "Unknown")).replace('"', "'")
-        reg = str(cluster.get("Region", "Unknown")).replace('"', "'")
-        
-        # Version Check
-        k_box = status_boxes.get(cluster.get("K8s Status", "Unknown"), status_boxes["Unknown"])
-        
-        # Region Mismatch Check
-        if reg in ["N/A", "Unknown", ""] or parent_region in ["N/A", "Unknown", ""]:
-            reg_status = "Unknown"
-        elif reg == parent_region:
-            reg_status = "Green"
-        else:
-            reg_status = "Red"
-        
-        reg_box = status_boxes.get(reg_status, status_boxes["Unknown"])
+                label = f"<b style='font-size: 2em;'>{c_name}</b><br><br>Provider: {prov}<br>Distro: {dist}<br><br>K8s: ☸️ {k_ver} {k_box}<br><br>🌍 Region: {reg} {reg_box}"
+                f.write(f'    {c_id}("{label}")\n')
+                f.write(f'    style {c_id} {MERMAID_CLASS_DEFS["downstream"]}\n')
+                
+                if s_id:
+                    f.write(f'    {s_id} --> {c_id}\n')
 
-        label = f"<b style='font-size: 2em;'>{c_name}</b><br><br>Provider: {prov}<br>Distro: {dist}<br><br>K8s: ☸️ {k_ver} {k_box}<br><br>🌍 Region: {reg} {reg_box}"
-        lines.append(f'    {c_id}("{label}")')
-        
-        lines.append(f'    style {c_id} fill:#ffffff,stroke:#cccccc,stroke-width:2px,stroke-dasharray: 5 5,color:#000000')
-        
-        if s_id:
-            lines.append(f'    {s_id} --> {c_id}')
+            f.write("\n")
 
-    lines.append("")
+            # 3. Create Harvester Nodes & Connections
+            for idx, cluster in enumerate(inventory.harvester):
+                h_id = f"HV_{idx}"
+                s_id = server_ids.get(cluster.server)
+                
+                c_name = _mermaid_text(cluster.name)
+                h_ver = _mermaid_text(cluster.harvester_version)
+                k_ver = _mermaid_text(cluster.k8s_version)
+                arch = _mermaid_text(cluster.cpu_arch)
+                
+                h_box = _status_box(cluster.harvester_status)
+                k_box = _status_box(cluster.k8s_status)
 
-    # 3. Create Harvester Nodes & Connections
-    for idx, cluster in enumerate(harvester_clusters):
-        h_id = f"HV_{idx}"
-        parent_name = cluster.get("Rancher Server")
-        s_id = server_ids.get(parent_name)
-        
-        c_name = str(cluster.get("Cluster Name", "Unknown")).replace('"', "'")
-        h_ver = str(cluster.get("Harvester Version", "Unknown")).replace('"', "'")
-        k_ver = str(cluster.get("Kubernetes Version", "Unknown")).replace('"', "'")
-        arch = str(cluster.get("CPU Arch", "Unknown")).replace('"', "'")
-        
-        h_box = status_boxes.get(cluster.get("Harvester Status", "Unknown"), status_boxes["Unknown"])
-        k_box = status_boxes.get(cluster.get("K8s Status", "Unknown"), status_boxes["Unknown"])
+                label = f"<b style='font-size: 2em;'>{c_name}</b><br><br>Harvester: 🚜 {h_ver} {h_box}<br><br>K8s: ☸️ {k_ver} {k_box}<br><br>Arch: {arch}"
+                f.write(f'    {h_id}("{label}")\n')
+                f.write(f'    style {h_id} {MERMAID_CLASS_DEFS["harvester"]}\n')
+                
+                if s_id:
+                    f.write(f'    {s_id} --> {h_id}\n')
 
-        label = f"<b style='font-size: 2em;'>{c_name}</b><br><br>Harvester: 🚜 {h_ver} {h_box}<br><br>K8s: ☸️ {k_ver} {k_box}<br><br>Arch: {arch}"
-        lines.append(f'    {h_id}("{label}")')
-        
-        lines.append(f'    style {h_id} fill:#fce4d6,stroke:#c65911,stroke-width:2px,stroke-dasharray: 5 5,color:#000000')
-        
-        if s_id:
-            lines.append(f'    {s_id} --> {h_id}')
+            f.write("```")
+        print(f"✅ Architecture diagram saved: {filename}")
+    except Exception as e:
+        print(f"⚠️ Failed to write Mermaid diagram: {e}")
+
+def _write_mermaid_header(f):
+    f.write("```mermaid\n")
+    f.write("flowchart TD\n")
+    f.write("    %% Rancher Architecture Topology\n")
+    for name, style in MERMAID_CLASS_DEFS.items():
+        f.write(f"    classDef {name} {style}\n")
+    f.write("\n")
+
+def _write_server_subgraph(f, idx, server, downstream, harvester, collapse_clusters):
+    """Streams one Rancher server and its clusters as a self-contained subgraph."""
+    s_id = f"SERVER_{idx}"
+    r_box = _status_box(server.rancher_status)
+    k_box = _status_box(server.k8s_status)
+
+    f.write(f'    subgraph SG_{idx}["{_mermaid_text(server.name)}"]\n')
+    f.write(f'        {s_id}("🏢 <b>{_mermaid_text(server.name)}</b><br>Rancher: {_mermaid_text(server.rancher_version)} {r_box}'
+            f'<br>K8s: {_mermaid_text(server.k8s_version)} {k_box}<br>🌍 {_mermaid_text(server.aws_region)}"):::server\n')
 
-    lines.append("```")
+    if collapse_clusters:
+        # One node per status bucket instead of one node per cluster
+        for kind, records, status_attr, css in [("DS", downstream, "k8s_status", "downstream"),
+                                                ("HV", harvester, "harvester_status", "harvester")]:
+            counts = {}
+            for record in records:
+                status = getattr(record, status_attr)
+                counts[status] = counts.get(status, 0) + 1
+            title = "Downstream" if kind == "DS" else "Harvester"
+            for status, count in counts.items():
+                n_id = f"{kind}_{idx}_{status}"
+                f.write(f'        {n_id}("{title}: {_status_box(status)} {status}<br><b>{count}</b> clusters"):::{css}\n')
+                f.write(f'        {s_id} --> {n_id}\n')
+    else:
+        for c_idx, cluster in enumerate(downstream):
+            c_id = f"DS_{idx}_{c_idx}"
+            f.write(f'        {c_id}("<b>{_mermaid_text(cluster.name)}</b><br>{_mermaid_text(cluster.k8s_distribution)} '
+                    f'{_mermaid_text(cluster.k8s_version)} {_status_box(cluster.k8s_status)}'
+                    f'<br>🌍 {_mermaid_text(cluster.region)} {_status_box(cluster.region_status)}"):::downstream\n')
+            f.write(f'        {s_id} --> {c_id}\n')
+        for h_idx, cluster in enumerate(harvester):
+            h_id = f"HV_{idx}_{h_idx}"
+            f.write(f'        {h_id}("<b>{_mermaid_text(cluster.name)}</b><br>🚜 {_mermaid_text(cluster.harvester_version)} '
+                    f'{_status_box(cluster.harvester_status)}<br>K8s: {_mermaid_text(cluster.k8s_version)} {_status_box(cluster.k8s_status)}"):::harvester\n')
+            f.write(f'        {s_id} --> {h_id}\n')
+    f.write("    end\n\n")
+
+def generate_scalable_mermaid_diagram(inventory, filename="rancher_architecture.md", node_threshold=300, collapse_clusters=False):
+    """Writes one subgraph per Rancher server with shared classDef styles, streamed straight to disk.
+
+    Above `node_threshold` nodes each server gets its own diagram file and the main file becomes an
+    index of servers with per-status cluster counts.
+    """
+    downstream_by_server = group_by_server(inventory.downstream)
+    harvester_by_server = group_by_server(inventory.harvester)
+    node_count = len(inventory.servers) + len(inventory.downstream) + len(inventory.harvester)
+    split = not collapse_clusters and node_count > node_threshold
+    base, ext = os.path.splitext(filename)
 
     try:
         with open(filename, "w") as f:
-            f.write("\n".join(lines))
-        print(f"✅ Architecture diagram saved: {filename}")
+            _write_mermaid_header(f)
+            server_files = []
+            for idx, server in enumerate(inventory.servers):
+                downstream = downstream_by_server.get(server.name, [])
+                harvester = harvester_by_server.get(server.name, [])
+                if not split:
+                    _write_server_subgraph(f, idx, server, downstream, harvester, collapse_clusters)
+                    continue
+
+                slug = re.sub(r'[^A-Za-z0-9]+', '-', server.name).strip('-').lower() or str(idx)
+                server_file = f"{base}_{idx}_{slug}{ext}"
+                with open(server_file, "w") as sf:
+                    _write_mermaid_header(sf)
+                    _write_server_subgraph(sf, idx, server, downstream, harvester, collapse_clusters)
+                    sf.write("```\n")
+                server_files.append((server.name, server_file))
+
+                counts = " ".join(
+                    f"{_status_box(status)} {sum(1 for c in downstream if c.k8s_status == status)}"
+                    for status in ["Green", "Yellow", "Red", "Unknown"]
+                )
+                f.write(f'    SERVER_{idx}("🏢 <b>{_mermaid_text(server.name)}</b><br>Rancher: {_mermaid_text(server.rancher_version)} '
+                        f'{_status_box(server.rancher_status)}<br>Downstream: {counts}<br>Harvester: {len(harvester)}"):::server\n')
+            f.write("```\n")
+
+            if server_files:
+                f.write("\n## Per-Server Diagrams\n\n")
+                for name, server_file in server_files:
+                    f.write(f"- [{name}]({os.path.basename(server_file)})\n")
+        print(f"✅ Architecture diagram saved: {filename}" + (f" (+{len(server_files)} per-server files)" if server_files else ""))
     except Exception as e:
         print(f"⚠️ Failed to write Mermaid diagram: {e}")
 
 
+# ==========================================
+# MACHINE-READABLE OUTPUT SINKS
+# ==========================================
+
+OUTPUT_FORMATS = ["xlsx", "mermaid", "ndjson", "csv", "parquet"]
+DEFAULT_FORMATS = ["xlsx", "mermaid"]
+
+RECORD_TYPES = [("server", ServerRecord), ("downstream", ClusterRecord), ("harvester", HarvesterRecord)]
+
+def _inventory_records(inventory, kind):
+    return {"server": inventory.servers, "downstream": inventory.downstream, "harvester": inventory.harvester}[kind]
+
+class NdjsonSink:
+    """Streams one JSON object per record as soon as the scan finishes it, tagged with its `kind`."""
+
+    def __init__(self, filename="rancher_inventory.ndjson"):
+        self.filename = filename
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(filename, "w")
+
+    def write(self, kind, record):
+        line = json.dumps(dict({"kind": kind}, **record.as_dict()))
+        with self._lock:
+            self._file.write(line + "\n")
+            self.count += 1
+
+    def close(self, inventory):
+        self._file.close()
+        print(f"✅ NDJSON saved: {self.filename} ({self.count} records)")
+
+class CsvSink:
+    """Writes one flat CSV per record type (servers, downstream, harvester) once the scan completes."""
+
+    def __init__(self, filename="rancher_inventory.csv"):
+        self.base, self.ext = os.path.splitext(filename)
+
+    def write(self, kind, record):
+        pass
+
+    def close(self, inventory):
+        for kind, record_type in RECORD_TYPES:
+            filename = f"{self.base}_{kind}{self.ext}"
+            with open(filename, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(record_type.__slots__)
+                for record in _inventory_records(inventory, kind):
+                    writer.writerow([getattr(record, field) for field in record_type.__slots__])
+            print(f"✅ CSV saved: {filename}")
+
+class ParquetSink:
+    """Writes one Parquet file per record type. Needs the optional `pyarrow` package."""
+
+    def __init__(self, filename="rancher_inventory.parquet"):
+        self.base, self.ext = os.path.splitext(filename)
+
+    def write(self, kind, record):
+        pass
+
+    def close(self, inventory):
+        import pandas as pd
+        for kind, record_type in RECORD_TYPES:
+            filename = f"{self.base}_{kind}{self.ext}"
+            records = _inventory_records(inventory, kind)
+            columns = {field: [getattr(r, field) for r in records] for field in record_type.__slots__}
+            try:
+                pd.DataFrame(columns, columns=list(record_type.__slots__)).to_parquet(filename, index=False)
+            except ImportError:
+                print("⚠️ Parquet output needs the optional pyarrow package (pip install pyarrow), skipping.")
+                return
+            print(f"✅ Parquet saved: {filename}")
+
+SINKS = {
+    "ndjson": NdjsonSink,
+    "csv": CsvSink,
+    "parquet": ParquetSink,
+}
+
+def parse_formats(value):
+    formats = [fmt.strip().lower() for fmt in value.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"unknown format(s) {', '.join(unknown) or value!r}; choose from {', '.join(OUTPUT_FORMATS)}")
+    return formats
+
+
+# ==========================================
+# AUDIT HISTORY (SQLITE)
+# ==========================================
+
+# Table per record type; columns follow the record slots, plus a derived Kubernetes minor
+# so version-drift queries can group on an indexed column instead of parsing strings.
+HISTORY_TABLES = [("server", "servers", ServerRecord), ("downstream", "downstream_clusters", ClusterRecord),
+                  ("harvester", "harvester_clusters", HarvesterRecord)]
+
+def open_history(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT NOT NULL,
+            finished_at TEXT NOT NULL,
+            as_of TEXT,
+            filters TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_runs_started ON runs (started_at);
+    """)
+    # Stores created before filtered runs were tagged get the column added in place
+    if "filters" not in [row[1] for row in conn.execute("PRAGMA table_info(runs)")]:
+        conn.execute("ALTER TABLE runs ADD COLUMN filters TEXT")
+    for kind, table, record_type in HISTORY_TABLES:
+        columns = ", ".join(f"{field} {'REAL' if field in ['cpu_cores', 'memory_gib'] else 'INTEGER' if field == 'pods' else 'TEXT'}"
+                            for field in record_type.__slots__)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (run_id INTEGER NOT NULL REFERENCES runs (id), {columns}, k8s_minor TEXT)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_run ON {table} (run_id, k8s_minor)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_name ON {table} (name, run_id)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_version ON {table} (k8s_minor, run_id)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_status ON {table} (k8s_status, run_id)")
+    return conn
+
+def _k8s_minor(version):
+    match = K8S_MINOR_RE.search(str(version or ""))
+    return match.group(1) if match else None
+
+def record_history(inventory, path, started_at, as_of=None, filters=None):
+    """Appends one run to the history store in a single transaction.
+
+    `filters` describes the --instance / --cluster / --provider selection of a partial run; such
+    runs are listed but left out of drift reports by default.
+    """
+    try:
+        conn = open_history(path)
+        with conn:
+            run_id = conn.execute("INSERT INTO runs (started_at, finished_at, as_of, filters) VALUES (?, ?, ?, ?)",
+                                  (started_at.isoformat(timespec="seconds"), datetime.now().isoformat(timespec="seconds"),
+                                   as_of.isoformat() if as_of else None, filters)).lastrowid
+            for kind, table, record_type in HISTORY_TABLES:
+                fields = list(record_type.__slots__)
+                placeholders = ", ".join("?" * (len(fields) + 2))
+                conn.executemany(
+                    f"INSERT INTO {table} (run_id, {', '.join(fields)}, k8s_minor) VALUES ({placeholders})",
+                    ([run_id] + [getattr(r, f) for f in fields] + [_k8s_minor(r.k8s_version)]
+                     for r in _inventory_records(inventory, kind)))
+        conn.close()
+        print(f"🗄️ Audit run #{run_id} recorded in {path}")
+    except sqlite3.Error as e:
+        print(f"⚠️ Warning: Could not record audit history in {path}: {e}")
+
+def history_runs(conn, since=None, limit=20):
+    return conn.execute("""
+        SELECT r.id, r.started_at, r.filters,
+               (SELECT COUNT(*) FROM servers WHERE run_id = r.id),
+               (SELECT COUNT(*) FROM downstream_clusters WHERE run_id = r.id),
+               (SELECT COUNT(*) FROM harvester_clusters WHERE run_id = r.id)
+        FROM runs r WHERE r.started_at >= ? ORDER BY r.id DESC LIMIT ?
+    """, (since or "", limit)).fetchall()
+
+def history_drift(conn, since=None, limit=20, include_partial=False):
+    """Clusters per Kubernetes minor for each run (downstream and Harvester together).
+
+    Filtered runs only saw part of the fleet, so they are skipped unless `include_partial` is set.
+    """
+    return conn.execute("""
+        WITH recent AS (SELECT id, started_at FROM runs WHERE started_at >= ? AND (? OR filters IS NULL)
+                        ORDER BY id DESC LIMIT ?)
+        SELECT id, started_at, k8s_minor, SUM(n) FROM (
+            SELECT r.id, r.started_at, c.k8s_minor, COUNT(*) AS n
+            FROM recent r JOIN downstream_clusters c ON c.run_id = r.id GROUP BY r.id, c.k8s_minor
+            UNION ALL
+            SELECT r.id, r.started_at, c.k8s_minor, COUNT(*) AS n
+            FROM recent r JOIN harvester_clusters c ON c.run_id = r.id GROUP BY r.id, c.k8s_minor
+        ) GROUP BY id, k8s_minor ORDER BY id, k8s_minor
+    """, (since or "", include_partial, limit)).fetchall()
+
+def history_status(conn, cluster_name, since=None):
+    """A cluster's version and status per run, reduced to the runs where something changed."""
+    rows = conn.execute("""
+        SELECT r.started_at, c.server, c.k8s_version, c.k8s_status
+        FROM (SELECT run_id, server, k8s_version, k8s_status FROM downstream_clusters WHERE name = ?
+              UNION ALL SELECT run_id, server, k8s_version, k8s_status FROM harvester_clusters WHERE name = ?) c
+        JOIN runs r ON r.id = c.run_id
+        WHERE r.started_at >= ? ORDER BY c.server, r.id
+    """, (cluster_name, cluster_name, since or "")).fetchall()
+    transitions, last = [], {}
+    for started_at, server, version, status in rows:
+        if last.get(server) != (version, status):
+            transitions.append((started_at, server, version, status))
+            last[server] = (version, status)
+    return transitions
+
+
+# ==========================================
+# DAEMON MODE
+# ==========================================
+
+def _prom_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _prom_line(name, labels, value):
+    rendered = ",".join(f'{key}="{_prom_label(val)}"' for key, val in labels.items())
+    return f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}"
+
+class AuditDaemon:
+    """Re-scans instances on a schedule with warm sessions and lifecycle data, and keeps the latest inventory.
+
+    After an initial pass over every instance, rescans are staggered evenly across the interval
+    so the Rancher servers never see the whole fleet scanned at once.
+    """
+
+    def __init__(self, instances, settings, cluster_filter=None, harvester_versions=None):
+        self.instances = instances
+        self.settings = settings
+        self.cluster_filter = cluster_filter
+        self.harvester_versions = harvester_versions
+        self.interval = float(settings["daemon_interval_seconds"])
+        self.results = {}
+        self.scanned_at = {}
+        self.scan_seconds = {}
+        self.inventory = Inventory([], [], [])
+        self.lifecycle_loaded = None
+        self.scheduler = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def refresh_lifecycle(self):
+        # Reload once the cache TTL has passed, and at midnight so "as of today" moves on
+        now = datetime.now()
+        ttl = timedelta(hours=float(self.settings["lifecycle_cache_ttl_hours"]))
+        if self.lifecycle_loaded is None or now.date() != self.lifecycle_loaded.date() or now - self.lifecycle_loaded >= ttl:
+            reset_lifecycle_index()
+            get_lifecycle_index()
+            self.lifecycle_loaded = now
+
+    def scan(self, idx):
+        instance = self.instances[idx]
+        self.refresh_lifecycle()
+        RESPONSE_CACHE.clear()
+        started = time.monotonic()
+        result = scan_instance(instance, self.settings, cluster_filter=self.cluster_filter,
+                               harvester_versions=self.harvester_versions)
+        if self.harvester_versions:
+            self.harvester_versions.save()
+        with self._lock:
+            self.results[idx] = result
+            self.scanned_at[instance['name']] = time.time()
+            self.scan_seconds[instance['name']] = time.monotonic() - started
+            ordered = [self.results[i] for i in sorted(self.results)]
+            self.inventory = Inventory([r[0] for r in ordered],
+                                       [c for r in ordered for c in r[1]],
+                                       [c for r in ordered for c in r[2]])
+        print(f"🔄 Rescanned {instance['name']} in {self.scan_seconds[instance['name']]:.1f}s")
+
+    def scan_logged(self, idx):
+        # One failing instance must not take the scheduler thread down with it
+        try:
+            self.scan(idx)
+        except Exception as e:
+            print(f"⚠️ Scheduled scan of {self.instances[idx]['name']} failed: {e}")
+
+    def run(self):
+        for idx in range(len(self.instances)):
+            if self._stop.is_set():
+                return
+            self.scan_logged(idx)
+
+        start = time.monotonic()
+        count = max(len(self.instances), 1)
+        next_due = [start + self.interval * (1 + idx / count) for idx in range(len(self.instances))]
+        while next_due and not self._stop.is_set():
+            idx = min(range(len(next_due)), key=next_due.__getitem__)
+            if self._stop.wait(max(0, next_due[idx] - time.monotonic())):
+                return
+            self.scan_logged(idx)
+            next_due[idx] += self.interval
+
+    def start(self):
+        self.scheduler = threading.Thread(target=self.run, name="audit-scheduler", daemon=True)
+        self.scheduler.start()
+
+    @property
+    def healthy(self):
+        return self.scheduler is not None and self.scheduler.is_alive()
+
+    def stop(self):
+        self._stop.set()
+
+    def inventory_json(self):
+        with self._lock:
+            inventory = self.inventory
+            scanned_at = dict(self.scanned_at)
+        return {
+            "scanned_at": {name: datetime.fromtimestamp(ts).isoformat(timespec="seconds") for name, ts in scanned_at.items()},
+            "servers": [r.as_dict() for r in inventory.servers],
+            "downstream": [r.as_dict() for r in inventory.downstream],
+            "harvester": [r.as_dict() for r in inventory.harvester],
+        }
+
+    def metrics_text(self):
+        with self._lock:
+            inventory = self.inventory
+            scanned_at = dict(self.scanned_at)
+            scan_seconds = dict(self.scan_seconds)
+
+        def counts(records, status_attr):
+            grouped = {}
+            for record in records:
+                key = (record.server, getattr(record, status_attr))
+                grouped[key] = grouped.get(key, 0) + 1
+            return grouped
+
+        lines = ["# HELP rancher_audit_server_info Management server versions and lifecycle status.",
+                 "# TYPE rancher_audit_server_info gauge"]
+        for server in inventory.servers:
+            lines.append(_prom_line("rancher_audit_server_info", {
+                "server": server.name, "rancher_version": server.rancher_version, "rancher_status": server.rancher_status,
+                "k8s_version": server.k8s_version, "k8s_status": server.k8s_status}, 1))
+
+        lines += ["# HELP rancher_audit_servers Management servers by Rancher lifecycle status.",
+                  "# TYPE rancher_audit_servers gauge"]
+        by_status = {}
+        for server in inventory.servers:
+            by_status[server.rancher_status] = by_status.get(server.rancher_status, 0) + 1
+        for status, count in sorted(by_status.items()):
+            lines.append(_prom_line("rancher_audit_servers", {"rancher_status": status}, count))
+
+        lines += ["# HELP rancher_audit_clusters Downstream and Harvester clusters by Kubernetes lifecycle status.",
+                  "# TYPE rancher_audit_clusters gauge"]
+        for kind, records in [("downstream", inventory.downstream), ("harvester", inventory.harvester)]:
+            for (server, status), count in sorted(counts(records, "k8s_status").items()):
+                lines.append(_prom_line("rancher_audit_clusters", {"server": server, "kind": kind, "k8s_status": status}, count))
+
+        lines += ["# HELP rancher_audit_harvester_clusters Harvester clusters by Harvester lifecycle status.",
+                  "# TYPE rancher_audit_harvester_clusters gauge"]
+        for (server, status), count in sorted(counts(inventory.harvester, "harvester_status").items()):
+            lines.append(_prom_line("rancher_audit_harvester_clusters", {"server": server, "harvester_status": status}, count))
+
+        lines += ["# HELP rancher_audit_region_mismatches Downstream clusters in a different region than their Rancher server.",
+                  "# TYPE rancher_audit_region_mismatches gauge"]
+        mismatches = counts(inventory.downstream, "region_status")
+        for server in inventory.servers:
+            lines.append(_prom_line("rancher_audit_region_mismatches", {"server": server.name}, mismatches.get((server.name, "Red"), 0)))
+
+        lines += ["# HELP rancher_audit_last_scan_timestamp_seconds When each instance was last scanned.",
+                  "# TYPE rancher_audit_last_scan_timestamp_seconds gauge"]
+        for name, ts in sorted(scanned_at.items()):
+            lines.append(_prom_line("rancher_audit_last_scan_timestamp_seconds", {"server": name}, round(ts, 3)))
+        lines += ["# HELP rancher_audit_scan_duration_seconds Duration of each instance's last scan.",
+                  "# TYPE rancher_audit_scan_duration_seconds gauge"]
+        for name, seconds in sorted(scan_seconds.items()):
+            lines.append(_prom_line("rancher_audit_scan_duration_seconds", {"server": name}, round(seconds, 3)))
+
+        # API cost of the daemon itself, from the request instrumentation
+        lines += ["# HELP rancher_audit_api_request_duration_seconds Rancher API requests made by the audit.",
+                  "# TYPE rancher_audit_api_request_duration_seconds histogram"]
+        for entry in METRICS.as_dict()["requests"]:
+            labels = {"instance": entry["instance"], "endpoint": entry["endpoint"]}
+            cumulative = 0
+            for bound, count in entry["histogram"].items():
+                cumulative += count
+                lines.append(_prom_line("rancher_audit_api_request_duration_seconds_bucket", dict(labels, le=bound), cumulative))
+            lines.append(_prom_line("rancher_audit_api_request_duration_seconds_sum", labels, entry["seconds"]))
+            lines.append(_prom_line("rancher_audit_api_request_duration_seconds_count", labels, entry["count"]))
+        return "\n".join(lines) + "\n"
+
+def make_daemon_handler(daemon):
+    class DaemonHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def send(self, code, body, content_type):
+            payload = body.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/metrics":
+                return self.send(200, daemon.metrics_text(), "text/plain; version=0.0.4; charset=utf-8")
+            if path in ["/", "/inventory", "/inventory.json"]:
+                return self.send(200, json.dumps(daemon.inventory_json()), "application/json")
+            if path == "/healthz":
+                if not daemon.healthy:
+                    return self.send(503, "scheduler stopped\n", "text/plain")
+                return self.send(200, "ok\n", "text/plain")
+            return self.send(404, "not found\n", "text/plain")
+
+    return DaemonHandler
+
+
+# ==========================================
+# COMMAND LINE
+# ==========================================
+
+def select_instances(instances, names):
+    if not names:
+        return instances
+    selected = [i for i in instances if i.get('name') in names]
+    for name in sorted(set(names) - {i.get('name') for i in selected}):
+        print(f"⚠️ No instance named '{name}' in the config.")
+    return selected
+
+def load_harvester_versions(settings, refresh=False):
+    # Like the snapshot, the version cache is bypassed while recording or replaying an archive
+    if not settings["harvester_version_cache"] or API_ARCHIVE.mode:
+        return None
+    return HarvesterVersionCache.load(settings["harvester_version_cache"], settings["harvester_version_ttl_hours"], refresh)
+
+def describe_scan_filters(args):
+    """The scan filters as CLI options, or None for a full-fleet run."""
+    parts = [f"--{option} {value}" for option in ["instance", "cluster", "provider"]
+             for value in getattr(args, option, None) or []]
+    return " ".join(parts) or None
+
+def run_audit_command(args, config, settings):
+    started_at = datetime.now()
+    instances = select_instances(config['rancher_instances'], args.instance)
+    cluster_filter = None
+    if args.cluster or args.provider:
+        cluster_filter = ClusterFilter(args.cluster, args.provider)
+    sinks = [SINKS[fmt]() for fmt in args.format if fmt in SINKS]
+
+    def write_record(kind, record):
+        for sink in sinks:
+            sink.write(kind, record)
+
+    # Recording needs every enrichment response and a replay must not touch the snapshot or history
+    snapshot = None
+    if settings["incremental_audit"] and not args.full and not API_ARCHIVE.mode:
+        snapshot = AuditSnapshot.load(settings["snapshot_file"], settings["incremental_max_age_hours"])
+
+    harvester_versions = load_harvester_versions(settings, refresh=args.full)
+
+    inventory = run_audit(instances, settings, write_record if sinks else None, cluster_filter, snapshot,
+                          harvester_versions)
+
+    if snapshot:
+        snapshot.report_changes()
+        snapshot.save()
+    if harvester_versions:
+        harvester_versions.report()
+        harvester_versions.save()
+    if settings["history_db"] and not API_ARCHIVE.replaying:
+        record_history(inventory, settings["history_db"], started_at, args.as_of, describe_scan_filters(args))
+
+    for sink in sinks:
+        with METRICS.phase(type(sink).__name__.replace("Sink", "").lower()):
+            sink.close(inventory)
+    if "xlsx" in args.format:
+        with METRICS.phase("excel"):
+            save_styled_excel(inventory, constant_memory=settings["excel_constant_memory"])
+    if "mermaid" in args.format:
+        with METRICS.phase("mermaid"):
+            generate_mermaid_diagram(inventory, layout=settings["mermaid_layout"],
+                                     node_threshold=settings["mermaid_node_threshold"],
+                                     collapse_clusters=settings["mermaid_collapse_clusters"])
+
+def run_serve_command(args, config, settings):
+    instances = select_instances(config['rancher_instances'], args.instance)
+    cluster_filter = ClusterFilter(args.cluster, args.provider) if args.cluster or args.provider else None
+    if args.interval:
+        settings["daemon_interval_seconds"] = args.interval
+    host, _, port = (args.listen or settings["daemon_listen"]).rpartition(":")
+
+    daemon = AuditDaemon(instances, settings, cluster_filter, load_harvester_versions(settings))
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), make_daemon_handler(daemon))
+    server.daemon_threads = True
+    daemon.start()
+    print(f"📡 Serving inventory on http://{host or '127.0.0.1'}:{port}/inventory.json and /metrics, "
+          f"rescanning every {daemon.interval:g}s")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down")
+    finally:
+        daemon.stop()
+        server.server_close()
+
+def run_summary_command(args, config, settings):
+    instances = select_instances(config['rancher_instances'], args.instance)
+    workers = max(1, min(int(settings["max_parallel_instances"] or 1), len(instances) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        summaries = list(pool.map(lambda i: summarise_instance(i, settings), instances))
+
+    print()
+    for summary in summaries:
+        print(f"🏢 {summary.name} ({summary.url})")
+        print(f"    Rancher: 🐄 {summary.rancher_version} {STATUS_BOXES.get(summary.rancher_status, STATUS_BOXES['Unknown'])}")
+        print(f"    K8s: ☸️ {summary.k8s_version} {STATUS_BOXES.get(summary.k8s_status, STATUS_BOXES['Unknown'])}")
+        print(f"    🌍 Region: {summary.aws_region}   💾 Backup: {summary.backup_operator}")
+
+def run_lifecycle_check_command(args, config, settings):
+    checks = [("k8s", "Kubernetes", v) for v in args.k8s] + \
+             [("rancher", "Rancher", v) for v in args.rancher] + \
+             [("harvester", "Harvester", v) for v in args.harvester]
+    if not checks:
+        print("Nothing to check: pass at least one of --k8s, --rancher or --harvester.")
+        return
+    index = get_lifecycle_index()
+    for product, label, version in checks:
+        status, detail = index.status(product, version)
+        print(f"{STATUS_BOXES.get(status, STATUS_BOXES['Unknown'])} [{status.upper()}] {label} {version} {detail}".rstrip())
+
+def run_history_command(args, config, settings):
+    if not settings["history_db"] or not os.path.exists(settings["history_db"]):
+        print(f"No audit history found at '{settings['history_db']}'. Run an audit first.")
+        return
+    conn = open_history(settings["history_db"])
+    since = args.since.isoformat() if args.since else None
+
+    if args.report == "runs":
+        for run_id, started_at, filters, servers, downstream, harvester in history_runs(conn, since, args.limit):
+            partial = f"  (partial: {filters})" if filters else ""
+            print(f"#{run_id}  {started_at}  {servers} servers, {downstream} downstream, {harvester} Harvester{partial}")
+    elif args.report == "drift":
+        current_run = None
+        for run_id, started_at, minor, count in history_drift(conn, since, args.limit, args.include_partial):
+            if run_id != current_run:
+                print(f"\n#{run_id}  {started_at}")
+                current_run = run_id
+            print(f"    ☸️ {minor or 'Unknown'}: {count}")
+    else:
+        if not args.cluster:
+            print("The status report needs --cluster NAME.")
+            return
+        for started_at, server, version, status in history_status(conn, args.cluster, since):
+            print(f"{started_at}  [{server}] {args.cluster}: {version} {STATUS_BOXES.get(status, STATUS_BOXES['Unknown'])} {status}")
+    conn.close()
+
+def run_profiled(command, path, *args):
+    """Runs a command under cProfile, including the scan's worker threads, and saves the merged stats."""
+    import cProfile
+    import pstats
+    import sys
+
+    thread_profiles = []
+    if sys.version_info < (3, 12):
+        # Before 3.12 a profiler only sees the thread that enabled it, so each new worker starts its own
+        def start_thread_profile(frame, event, arg):
+            profile = cProfile.Profile()
+            thread_profiles.append(profile)
+            profile.enable()
+        threading.setprofile(start_thread_profile)
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        command(*args)
+    finally:
+        profiler.disable()
+        threading.setprofile(None)
+        stats = pstats.Stats(profiler)
+        for profile in thread_profiles:
+            profile.disable()
+            stats.add(profile)
+        stats.dump_stats(path)
+        print(f"\n🔬 Profile saved: {path} (top functions by cumulative time)")
+        stats.sort_stats("cumulative").print_stats(25)
+
+COMMANDS = {
+    "audit": run_audit_command,
+    "summary": run_summary_command,
+    "lifecycle-check": run_lifecycle_check_command,
+    "history": run_history_command,
+    "serve": run_serve_command,
+}
+
+def add_scan_filters(parser, default, clusters=True):
+    # Subcommands pass argparse.SUPPRESS so they do not reset filters given before the subcommand
+    parser.add_argument("--instance", action="append", default=default, metavar="NAME",
+                        help="Only scan the instance with this config name (repeatable)")
+    if clusters:
+        parser.add_argument("--cluster", action="append", default=default, metavar="PATTERN",
+                            help="Only clusters whose name matches this glob, or regex with a 're:' prefix (repeatable)")
+        parser.add_argument("--provider", action="append", default=default, metavar="TYPE",
+                            help="Only clusters of this provider type, e.g. Harvester, Imported, Custom (repeatable)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Audit Rancher management servers and their downstream clusters.")
+    parser.add_argument("--config", default="config.yaml", help="Path to the YAML configuration file")
+    parser.add_argument("--offline", action="store_true",
+                        help="Serve endoflife.date lifecycle data from the on-disk cache only")
+    parser.add_argument("--seed-lifecycle-cache", metavar="SNAPSHOT",
+                        help="Seed the lifecycle cache from a snapshot file before running")
+    parser.add_argument("--as-of", metavar="YYYY-MM-DD", type=lambda v: datetime.strptime(v, "%Y-%m-%d").date(),
+                        help="Evaluate lifecycle status as of this date instead of today (upgrade planning)")
+    parser.add_argument("--export-lifecycle-snapshot", metavar="SNAPSHOT",
+                        help="Write the current lifecycle cache to a snapshot file and exit")
+    format_help = f"Comma-separated outputs to write ({', '.join(OUTPUT_FORMATS)}; default: {','.join(DEFAULT_FORMATS)})"
+    parser.add_argument("--format", type=parse_formats, default=DEFAULT_FORMATS, help=format_help)
+    add_scan_filters(parser, None)
+    parser.add_argument("--full", action="store_true",
+                        help="Re-enrich every cluster instead of reusing unchanged ones from the last audit")
+    parser.add_argument("--profile", nargs="?", const="rancher-audit.prof", metavar="FILE",
+                        help="Run under cProfile (worker threads included), print the top functions and save the stats")
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument("--record", metavar="ARCHIVE",
+                         help="Save every API and lifecycle response of this run to a gzipped archive")
+    archive.add_argument("--replay", metavar="ARCHIVE",
+                         help="Rebuild the outputs from a recorded archive without any network access")
+
+    # Without a subcommand the full audit runs, as it always has
+    commands = parser.add_subparsers(dest="command", metavar="{audit,summary,lifecycle-check,history,serve}")
+    audit = commands.add_parser("audit", help="Scan every instance and write the selected outputs (default)")
+    audit.add_argument("--format", type=parse_formats, default=argparse.SUPPRESS, help=format_help)
+    audit.add_argument("--full", action="store_true", default=argparse.SUPPRESS,
+                       help="Re-enrich every cluster instead of reusing unchanged ones from the last audit")
+    add_scan_filters(audit, argparse.SUPPRESS)
+
+    summary = commands.add_parser("summary", help="Print each management server's versions and lifecycle status")
+    add_scan_filters(summary, argparse.SUPPRESS, clusters=False)
+
+    check = commands.add_parser("lifecycle-check", help="Print the lifecycle status of the given versions")
+    check.add_argument("--k8s", action="append", default=[], metavar="VERSION", help="Kubernetes version, e.g. v1.28.3")
+    check.add_argument("--rancher", action="append", default=[], metavar="VERSION", help="Rancher version, e.g. v2.8.5")
+    check.add_argument("--harvester", action="append", default=[], metavar="VERSION", help="Harvester version, e.g. v1.3.1")
+
+    serve = commands.add_parser("serve", help="Run as a daemon: rescan on a schedule and serve JSON and Prometheus metrics")
+    add_scan_filters(serve, argparse.SUPPRESS)
+    serve.add_argument("--listen", metavar="HOST:PORT", help="Address to serve on (default: daemon_listen setting)")
+    serve.add_argument("--interval", type=float, metavar="SECONDS",
+                       help="Seconds between rescans of each instance (default: daemon_interval_seconds setting)")
+
+    history = commands.add_parser("history", help="Trend reports from the audit history store")
+    history.add_argument("report", choices=["runs", "drift", "status"],
+                         help="runs: recorded audits; drift: clusters per K8s minor per run; status: one cluster over time")
+    history.add_argument("--cluster", metavar="NAME", help="Cluster name for the status report")
+    history.add_argument("--since", metavar="YYYY-MM-DD", type=lambda v: datetime.strptime(v, "%Y-%m-%d").date(),
+                         help="Only runs started on or after this date")
+    history.add_argument("--limit", type=int, default=20, help="Most recent runs to include (runs and drift)")
+    history.add_argument("--include-partial", action="store_true",
+                         help="Include runs narrowed by --instance / --cluster / --provider in the drift report")
+
+    args = parser.parse_args(argv)
+    args.command = args.command or "audit"
+    return args
+
+
 if __name__ == "__main__":
-    config = load_config()
-    if config and "rancher_instances" in config:
-        instances = config['rancher_instances']
-        
-        server_list = [get_server_summary(i) for i in instances]
-        regular_clusters, harvester_clusters = get_cluster_data(instances)
-        
-        save_styled_excel(server_list, regular_clusters, harvester_clusters)
-        generate_mermaid_diagram(server_list, regular_clusters, harvester_clusters)
+    args = parse_args()
+    # lifecycle-check, history and replays work without any Rancher credentials
+    needs_config = not args.replay and args.command not in ["lifecycle-check", "history"]
+    config = load_config(args.config) if needs_config or os.path.exists(args.config) else None
+    settings = load_settings(config)
+    configure_lifecycle_cache(settings["lifecycle_cache_dir"], settings["lifecycle_cache_ttl_hours"], args.offline)
+
+    if args.replay:
+        # The recorded instances and URL-shaping settings replace the local ones, and statuses
+        # are evaluated as of the recording date unless --as-of says otherwise
+        API_ARCHIVE.start_replay(args.replay)
+        config = dict(config or {}, rancher_instances=API_ARCHIVE.instances)
+        settings.update(API_ARCHIVE.data["settings"])
+        set_lifecycle_as_of(args.as_of or API_ARCHIVE.recorded_on)
+    elif args.record and config and "rancher_instances" in config:
+        API_ARCHIVE.start_recording(args.record, config["rancher_instances"], settings)
+
+    if args.as_of:
+        print(f"📅 Evaluating lifecycle status as of {args.as_of}")
+        set_lifecycle_as_of(args.as_of)
+
+    if args.seed_lifecycle_cache and not seed_lifecycle_cache(args.seed_lifecycle_cache):
+        raise SystemExit(1)
+    if args.export_lifecycle_snapshot:
+        if not export_lifecycle_snapshot(args.export_lifecycle_snapshot):
+            raise SystemExit(1)
+    elif args.command in ["lifecycle-check", "history"] or (config and "rancher_instances" in config):
+        if args.profile:
+            run_profiled(COMMANDS[args.command], args.profile, args, config, settings)
+        else:
+            COMMANDS[args.command](args, config, settings)
+        if args.command in ["audit", "summary"]:
+            METRICS.report(settings["timing_report"])
+        RESPONSE_CACHE.report()
+        API_ARCHIVE.save()
+        close_clients()
@@ -54,7 +54,13 @@ def save_config(config_data, filepath=CONFIG_FILE):
                 for key, value in instance.items():
                     if key not in ['name', 'url', 'token', 'comment']:
                         f.write(f"    {key}: \"{value}\"\n")
-                        
+
+            # Carry any other top-level blocks (e.g. `settings:`) over untouched
+            extra_blocks = {k: v for k, v in config_data.items() if k != 'rancher_instances'}
+            if extra_blocks:
+                f.write("\n")
+                yaml.safe_dump(extra_blocks, f, default_flow_style=False, sort_keys=False)
+
         print(f"✅ Successfully updated {filepath} with new tokens.")
     except Exception as e:
         print(f"❌ Error saving new configuration: {e}")
@@ -79,6 +85,12 @@ def rotate_tokens(config_data):
             continue
 
         print(f"\n🔄 Initiating rotation for: {name}...")
+        # One keep-alive session per instance so the create/verify/revoke calls share a connection
+        verify = instance.get('verify', False)
+        if isinstance(verify, str) and verify.lower() in ['true', 'false']:
+            verify = verify.lower() == 'true'
+        session = requests.Session()
+        session.verify = verify
         headers = {"Authorization": f"Bearer {old_bearer_token}"}
         
         # Create the new token (30-day expiration)
@@ -91,7 +103,7 @@ def rotate_tokens(config_data):
 
         try:
             print("   -> Requesting new token...")
-            resp = requests.post(create_url, headers=headers, json=payload, verify=False, timeout=10)
+            resp = session.post(create_url, headers=headers, json=payload, timeout=10)
             resp.raise_for_status()
             
             new_token_data = resp.json()
@@ -106,7 +118,7 @@ def rotate_tokens(config_data):
             # Verify the new token works
             print("   -> Verifying new token...")
             verify_headers = {"Authorization": f"Bearer {new_bearer_token}"}
-            verify_resp = requests.get(f"{url}/v3/users?me=true", headers=verify_headers, verify=False, timeout=10)
+            verify_resp = session.get(f"{url}/v3/users?me=true", headers=verify_headers, timeout=10)
             verify_resp.raise_for_status()
 
             # Update memory
@@ -119,7 +131,7 @@ def rotate_tokens(config_data):
             revoke_url = f"{url}/v3/tokens/{old_token_id}"
             
             print(f"   -> Revoking old token ({old_token_id})...")
-            revoke_resp = requests.delete(revoke_url, headers=verify_headers, verify=False, timeout=10)
+            revoke_resp = session.delete(revoke_url, headers=verify_headers, timeout=10)
             
             if revoke_resp.status_code in [200, 204]:
                 print("   -> Old token safely destroyed.")
@@ -128,6 +140,8 @@ def rotate_tokens(config_data):
 
         except Exception as e:
             print(f"❌ Error rotating token for {name}: {e}")
+        finally:
+            session.close()
 
     return changes_made
 